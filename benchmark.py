@@ -0,0 +1,289 @@
+"""Benchmarks for the games and strategies, run without asking for input.
+
+For every game, at a few board sizes or start numbers, this times
+make_move, get_possible_moves, is_over and get_points over positions
+from random games. It then has every strategy in usable_strategies
+(except the interactive one) pick a move, on the games and sizes it can
+finish in reasonable time, and reports the time to move, the nodes
+(moves made) per second and the peak memory used.
+
+Run it as
+    python benchmark.py [--output results.json] [--compare old.json]
+to save the results as JSON, and to list what got slower since an
+earlier run.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import copy
+import json
+import platform
+import random
+import time
+import tracemalloc
+from game_interface import make_game, usable_strategies
+
+# Positions collected from random games for the engine benchmarks.
+ENGINE_POSITIONS = 300
+
+# Longest random game played, so games that can repeat positions stop.
+MAX_GAME_LENGTH = 100
+
+# Times each engine benchmark goes over its positions.
+ENGINE_REPEATS = 5
+
+# How much slower a result has to be to be reported by compare, and the
+# shortest time to move that is compared at all, since shorter ones are
+# mostly noise.
+REGRESSION_THRESHOLD = 0.2
+MIN_COMPARED_SECONDS = 0.01
+
+# Games, by their code in game_interface, and sizes to run them at: a
+# start number, a side length or the starting numbers.
+ENGINE_CASES = [('s', 100), ('s', 10000), ('h', 2), ('h', 3), ('h', 5),
+                ('h', 10), ('c', None), ('m', (5, 7, 9)),
+                ('m', (100, 200, 300, 400))]
+
+# Cases every strategy that searches to the end of the game can finish.
+# Chopsticks is left out of these and of Monte Carlo tree search, since
+# its positions repeat and random games of it can go on for very long.
+_EXHAUSTIVE = [('s', 100), ('s', 300), ('h', 2), ('m', (3, 4, 5))]
+
+STRATEGY_CASES = {'mr': _EXHAUSTIVE,
+                  'mi': _EXHAUSTIVE,
+                  'mp': _EXHAUSTIVE,
+                  'pm': _EXHAUSTIVE,
+                  'ab': _EXHAUSTIVE + [('h', 3)],
+                  'id': _EXHAUSTIVE + [('h', 3), ('h', 4)],
+                  'mc': [('s', 300), ('h', 2), ('h', 4)],
+                  'ct': [('c', None)],
+                  'sq': [('s', 1000), ('s', 100000)],
+                  'gr': [('m', (3, 4, 5)), ('m', (100, 200, 300, 400))],
+                  'db': [('h', 2), ('h', 3)]}
+
+
+def random_positions(game: Any, count: int,
+                     seed: int = 0) -> List[Any]:
+    """Return count positions of game, collected from random games that
+    start at its current state."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = game.current_state
+        for _ in range(MAX_GAME_LENGTH):
+            positions.append(state)
+            if game.is_over(state) or len(positions) == count:
+                break
+            state = state.make_move(rng.choice(state.get_possible_moves()))
+    return positions
+
+
+def fresh_copies(positions: List[Any]) -> List[Any]:
+    """Return copies of positions that share nothing with them, so
+    results the states keep, like their moves, are worked out again.
+    States are copied through to_bytes and from_bytes if they have them.
+    >>> state = make_game('h', 2).current_state
+    >>> moves = state.get_possible_moves()
+    >>> copied = fresh_copies([state])[0]
+    >>> copied == state, copied.get_possible_moves() is moves
+    (True, False)
+    """
+    if positions and hasattr(positions[0], 'to_bytes'):
+        from_bytes = type(positions[0]).from_bytes
+        return [from_bytes(state.to_bytes()) for state in positions]
+    return copy.deepcopy(positions)
+
+
+def _rate(function: Callable[[List[Any]], int],
+          positions: List[Any]) -> float:
+    """Return how many operations per second function does, where
+    function is given new copies of positions on every pass and returns
+    the number of operations it did. Making the copies is not timed."""
+    seconds = 0.0
+    operations = 0
+    for _ in range(ENGINE_REPEATS):
+        states = fresh_copies(positions)
+        start = time.perf_counter()
+        operations += function(states)
+        seconds += time.perf_counter() - start
+    return operations / seconds
+
+
+def bench_engine(code: str, size: Any) -> Dict[str, Any]:
+    """Return the operations per second of the state methods of the game
+    with code code and size size. Every pass is over new copies of the
+    positions, so no pass reads results an earlier one kept on them."""
+    game = make_game(code, size)
+    positions = random_positions(game, ENGINE_POSITIONS)
+    moves = [(index, move) for index, state in enumerate(positions)
+             if not game.is_over(state)
+             for move in state.get_possible_moves()]
+
+    def make_moves(states: List[Any]) -> int:
+        """Make every move of every position."""
+        for index, move in moves:
+            states[index].make_move(move)
+        return len(moves)
+
+    def possible_moves(states: List[Any]) -> int:
+        """Get the moves of every position."""
+        for state in states:
+            state.get_possible_moves()
+        return len(states)
+
+    def over(states: List[Any]) -> int:
+        """Check whether every position is over."""
+        for state in states:
+            game.is_over(state)
+        return len(states)
+
+    result = {'game': code, 'size': size,
+              'make_move': _rate(make_moves, positions),
+              'get_possible_moves': _rate(possible_moves, positions),
+              'is_over': _rate(over, positions)}
+    if hasattr(game.current_state, 'get_points'):
+
+        def points(states: List[Any]) -> int:
+            """Get the points of every position."""
+            for state in states:
+                state.get_points()
+            return len(states)
+        result['get_points'] = _rate(points, positions)
+    return result
+
+
+class _MoveCounter:
+    """Counts the calls to make_move and push on a state class while it
+    is in a with block."""
+    state_class: type
+    count: int
+
+    def __init__(self, state_class: type) -> None:
+        """Initializes a counter for state_class."""
+        self.state_class = state_class
+        self.count = 0
+        self._originals = {}
+
+    def __enter__(self) -> '_MoveCounter':
+        """Start counting."""
+        for name in ('make_move', 'push'):
+            original = getattr(self.state_class, name, None)
+            if original is not None:
+                self._originals[name] = original
+                setattr(self.state_class, name, self._counted(original))
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop counting."""
+        for name, original in self._originals.items():
+            setattr(self.state_class, name, original)
+
+    def _counted(self, method: Callable) -> Callable:
+        """Return method, counting its calls."""
+        def counted(state: Any, move: Any) -> Any:
+            """method, counted."""
+            self.count += 1
+            return method(state, move)
+        return counted
+
+
+def bench_strategy(strategy_code: str, code: str,
+                   size: Any) -> Dict[str, Any]:
+    """Return the time the strategy with code strategy_code takes to pick
+    the first move of the game with code code and size size, the moves
+    it made per second and the peak memory it used. Moves made in other
+    processes are not counted, and solvers that keep their tables between
+    calls build them during the timed call."""
+    strategy = usable_strategies[strategy_code]
+    game = make_game(code, size)
+    with _MoveCounter(type(game.current_state)) as counter:
+        start = time.perf_counter()
+        move = strategy(game)
+        seconds = time.perf_counter() - start
+    # again, to measure memory without slowing down the timed run
+    tracemalloc.start()
+    strategy(make_game(code, size))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'strategy': strategy_code, 'game': code, 'size': size,
+            'move': str(move), 'seconds': seconds, 'nodes': counter.count,
+            'nodes_per_second': counter.count / seconds if seconds else None,
+            'peak_bytes': peak}
+
+
+def run(strategy_codes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run every benchmark, or only those of the strategies in
+    strategy_codes, print the results and return them."""
+    results = {'python': platform.python_version(),
+               'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'engines': [], 'strategies': []}
+    if strategy_codes is None:
+        for code, size in ENGINE_CASES:
+            result = bench_engine(code, size)
+            results['engines'].append(result)
+            print('{} {}: {}'.format(code, size, ', '.join(
+                '{} {:.0f}/s'.format(name, result[name]) for name in
+                ('make_move', 'get_possible_moves', 'is_over', 'get_points')
+                if name in result)))
+        strategy_codes = [code for code in usable_strategies if code != 'i']
+    for strategy_code in strategy_codes:
+        if strategy_code not in STRATEGY_CASES:
+            print('{}: no benchmark cases'.format(strategy_code))
+        for code, size in STRATEGY_CASES.get(strategy_code, []):
+            result = bench_strategy(strategy_code, code, size)
+            results['strategies'].append(result)
+            print('{} on {} {}: {:.3f}s, {} nodes, {:.0f} KiB'.format(
+                strategy_code, code, size, result['seconds'],
+                result['nodes'], result['peak_bytes'] / 1024))
+    return results
+
+
+def _case(result: Dict[str, Any]) -> Tuple:
+    """Return what identifies the benchmark result was measured on."""
+    size = result['size']
+    return (result.get('strategy'), result['game'],
+            tuple(size) if isinstance(size, list) else size)
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Return a line for each result in new that is more than threshold
+    worse than the same result in old."""
+    slower = []
+    old_engines = {_case(result): result for result in old['engines']}
+    for result in new['engines']:
+        before = old_engines.get(_case(result))
+        for name in ('make_move', 'get_possible_moves', 'is_over',
+                     'get_points'):
+            if (before is not None and name in result and name in before
+                    and result[name] < before[name] / (1 + threshold)):
+                slower.append('{} {} {}: {:.0f}/s, was {:.0f}/s'.format(
+                    result['game'], result['size'], name, result[name],
+                    before[name]))
+    old_strategies = {_case(result): result
+                      for result in old['strategies']}
+    for result in new['strategies']:
+        before = old_strategies.get(_case(result))
+        if (before is not None
+                and before['seconds'] >= MIN_COMPARED_SECONDS
+                and result['seconds'] > before['seconds'] * (1 + threshold)):
+            slower.append('{} on {} {}: {:.3f}s, was {:.3f}s'.format(
+                result['strategy'], result['game'], result['size'],
+                result['seconds'], before['seconds']))
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='file to save the results to')
+    parser.add_argument('--compare', help='earlier results to compare to')
+    parser.add_argument('--strategies', nargs='*',
+                        help='only benchmark these strategies')
+    arguments = parser.parse_args()
+    benchmarks = run(arguments.strategies)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(benchmarks, output, indent=1)
+    if arguments.compare:
+        with open(arguments.compare) as earlier:
+            for line in compare(json.load(earlier), benchmarks):
+                print('slower:', line)
@@ -59,6 +59,8 @@ class ChopsticksState(CurrentState):
         self.other_left = other_hands[0]%5
         self.other_right = other_hands[1]%5
         self.player = player
+        # states before each move made with push
+        self._undo = []
 
     def get_possible_moves(self) -> List[str]:
         """returns a list of all possible moves.
@@ -88,6 +90,12 @@ class ChopsticksState(CurrentState):
         >>> x = s.make_move('ll')
         >>> print(x)
         p1: left 1-1 right ; p2: left 2-1 right"""
+        return ChopsticksState(*self._after(move))
+
+    def _after(self, move: str) -> Tuple[str, Tuple[int, int],
+                                         Tuple[int, int]]:
+        """Returns the player, current hands and opposing hands
+        after move is made."""
         new_left = self.other_left
         new_right = self.other_right
         if move == 'll':
@@ -101,8 +109,31 @@ class ChopsticksState(CurrentState):
         current_hand = (int(new_left), int(new_right))
         opposing_hand = (int(self.current_left), int(self.current_right))
         if self.player == 'p1':
-            return ChopsticksState('p2', current_hand, opposing_hand)
-        return ChopsticksState('p1', current_hand, opposing_hand)
+            return 'p2', current_hand, opposing_hand
+        return 'p1', current_hand, opposing_hand
+
+    def push(self, move: str) -> None:
+        """makes a move on this state itself, instead of returning a new
+        one. It can be taken back with pop.
+        >>> s = ChopsticksState()
+        >>> s.push('ll')
+        >>> print(s)
+        p1: left 1-1 right ; p2: left 2-1 right
+        >>> s.pop()
+        >>> s == ChopsticksState()
+        True"""
+        self._undo.append(self.key())
+        player, current_hand, opposing_hand = self._after(move)
+        self.player = player
+        self.current_left = current_hand[0] % 5
+        self.current_right = current_hand[1] % 5
+        self.other_left = opposing_hand[0] % 5
+        self.other_right = opposing_hand[1] % 5
+
+    def pop(self) -> None:
+        """takes back the last move made with push."""
+        (self.player, self.current_left, self.current_right,
+         self.other_left, self.other_right) = self._undo.pop()
 
     def __str__(self) -> str:
         """A string represention of SubtractSquareState
@@ -129,8 +160,41 @@ class ChopsticksState(CurrentState):
         >>> s == u
         False
         """
-        return (type(self) == type(other) and str(self) == str(other)
-                and self.player == other.player)
+        return type(self) == type(other) and self.key() == other.key()
+
+    def key(self) -> Tuple[str, int, int, int, int]:
+        """Returns a compact key identifying this state.
+        >>> ChopsticksState('p2', (0, 3)).key()
+        ('p2', 0, 3, 1, 1)
+        """
+        return (self.player, self.current_left, self.current_right,
+                self.other_left, self.other_right)
+
+    def __hash__(self) -> int:
+        """Returns a hash of this state, consistent with __eq__."""
+        return hash(self.key())
+
+    def to_bytes(self) -> bytes:
+        """Returns this state packed into 2 bytes: 3 bits for each hand,
+        then 1 bit that is set when it is p2's turn.
+        >>> s = ChopsticksState('p2', (0, 3), (4, 1))
+        >>> s.to_bytes()
+        b'\\x18\\x13'
+        >>> ChopsticksState.from_bytes(s.to_bytes()) == s
+        True
+        """
+        packed = (self.current_left | self.current_right << 3
+                  | self.other_left << 6 | self.other_right << 9
+                  | (self.player == 'p2') << 12)
+        return packed.to_bytes(2, 'little')
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'ChopsticksState':
+        """Returns the state packed into data by to_bytes."""
+        packed = int.from_bytes(data, 'little')
+        return ChopsticksState('p2' if packed >> 12 else 'p1',
+                               (packed & 7, packed >> 3 & 7),
+                               (packed >> 6 & 7, packed >> 9 & 7))
 
 if __name__ == "__main__":
     x = Chopsticks(True)
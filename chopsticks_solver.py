@@ -0,0 +1,135 @@
+"""A solver for Chopsticks by retrograde analysis, and a strategy that
+plays perfectly by looking positions up in its table.
+
+Chopsticks positions can repeat, so searching forward from a position, as
+the minimax strategies do, may never finish. Instead every position is
+listed once, and results are worked out backwards from the finished
+positions: a position is won if some move leads to a lost position, and
+lost if every move leads to a won position. Positions that are neither
+are draws, since neither player can force a result.
+"""
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from chopsticks import ChopsticksState
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# current player's left and right hands, then the other player's
+Hands = Tuple[int, int, int, int]
+
+# the solved table, only set once it is complete, so threads never see
+# part of it
+_TABLE = {}
+
+
+def _hands(state: ChopsticksState) -> Hands:
+    """Return the hands of state, ignoring whose turn it is."""
+    return (state.current_left, state.current_right, state.other_left,
+            state.other_right)
+
+
+def solve() -> Dict[Hands, Tuple[int, Optional[int], Optional[str]]]:
+    """Return a table mapping the hands of every Chopsticks position to
+    its result for the player to move (WIN, LOSS or DRAW), the number of
+    moves until that result (None for a draw), and the best move (None if
+    there are no moves). The table is built once and then reused.
+    >>> table = solve()
+    >>> len(table)
+    625
+    >>> table[(1, 1, 0, 0)]
+    (-1, 0, None)
+    >>> table[(1, 1, 4, 0)]
+    (1, 1, 'll')
+    """
+    global _TABLE
+    if _TABLE:
+        return _TABLE
+    children = {}
+    parents = {}
+    for hands in _all_hands():
+        state = ChopsticksState('p1', hands[:2], hands[2:])
+        children[hands] = [(move, _hands(state.make_move(move)))
+                           for move in state.get_possible_moves()]
+        for _, child in children[hands]:
+            parents.setdefault(child, []).append(hands)
+    results = {}
+    distances = {}
+    unsolved_children = {hands: len(children[hands]) for hands in children}
+    # a player with no moves has lost
+    queue = deque(hands for hands in children if not children[hands])
+    for hands in queue:
+        results[hands] = LOSS
+        distances[hands] = 0
+    while queue:
+        child = queue.popleft()
+        for hands in parents.get(child, []):
+            if hands in results:
+                continue
+            unsolved_children[hands] -= 1
+            if results[child] == LOSS:
+                results[hands] = WIN
+            elif unsolved_children[hands] == 0:
+                results[hands] = LOSS
+            else:
+                continue
+            distances[hands] = distances[child] + 1
+            queue.append(hands)
+    table = {}
+    for hands in children:
+        result = results.get(hands, DRAW)
+        table[hands] = (result, distances.get(hands),
+                        _best_move(children[hands], result, results,
+                                   distances))
+    _TABLE = table
+    return table
+
+
+def _all_hands() -> List[Hands]:
+    """Return the hands of every Chopsticks position."""
+    return [(a, b, c, d) for a in range(5) for b in range(5)
+            for c in range(5) for d in range(5)]
+
+
+def _best_move(children: List[Tuple[str, Hands]], result: int,
+               results: Dict[Hands, int],
+               distances: Dict[Hands, int]) -> Optional[str]:
+    """Return the best of the moves in children for a position with
+    result result: the quickest win, the slowest loss, or a move that
+    keeps the draw."""
+    best_move = None
+    best_distance = None
+    for move, child in children:
+        child_result = results.get(child, DRAW)
+        if child_result != -result:
+            continue
+        distance = distances.get(child)
+        if (best_move is None or
+                (result == WIN and distance < best_distance) or
+                (result == LOSS and distance > best_distance)):
+            best_move = move
+            best_distance = distance
+    return best_move
+
+
+def position_result(state: ChopsticksState) -> Tuple[int, Optional[int]]:
+    """Return the result of state for the player to move, and the number
+    of moves until it is reached (None for a draw).
+    >>> position_result(ChopsticksState())
+    (0, None)
+    """
+    result, distance, _ = solve()[_hands(state)]
+    return result, distance
+
+
+def chopsticks_strategy(game: Any) -> Any:
+    """Return the best move in the current state of the Chopsticks game
+    game, looked up in the table built by solve.
+    """
+    return solve()[_hands(game.current_state)][2]
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a1_pyta.txt")
@@ -3,19 +3,115 @@ The module used to play our games.
 
 """
 from strategy import *
-from typing import Any, Callable
+from typing import Any, Callable, Optional, Tuple
+import functools
+import time
+from transposition_table import TranspositionTable
+from mcts import mcts_strategy
+from chopsticks_solver import chopsticks_strategy
+from subtract_square_solver import subtract_square_strategy
+from multi_subtract_square import MultiSubtractSquare, grundy_strategy
+from stonehenge_db import stonehenge_db_strategy
 from subtract_square_game import SubtractSquareGame
+from subtract_square import SubtractSquare
 from stonehenge_game import Stonehenge
+from chopsticks import Chopsticks
 
 # 'h' should map to Stonehenge.
 playable_games = {'s': SubtractSquareGame,
-                  'h': Stonehenge}
+                  'h': Stonehenge,
+                  'c': Chopsticks,
+                  'm': MultiSubtractSquare}
+
+# Monte Carlo tree search stops after as many seconds as
+# iterative_deepening takes, so a move never takes much longer than that
+# on big boards, however many playouts it would make.
+timed_mcts_strategy = functools.update_wrapper(
+    functools.partial(mcts_strategy, time_limit=DEFAULT_TIME_LIMIT),
+    mcts_strategy)
 
 # 'mr' should map to your recursive implementation of minimax while
 # 'mi' should map to your iterative implementation of minimax
 usable_strategies = {'i': interactive_strategy,
                      'mr': recursive_minimax,
-                     'mi': iterative_minimax}
+                     'mi': iterative_minimax,
+                     'ab': alphabeta_minimax,
+                     'id': iterative_deepening,
+                     'mp': inplace_minimax,
+                     'pm': parallel_minimax,
+                     'mc': timed_mcts_strategy,
+                     'ct': chopsticks_strategy,
+                     'sq': subtract_square_strategy,
+                     'gr': grundy_strategy,
+                     'db': stonehenge_db_strategy}
+
+# How to build each game without asking for input, from whether player 1
+# starts and a size: a start number, a side length or the starting
+# numbers (Chopsticks has no size).
+game_builders = {'s': lambda p1_starts, size: SubtractSquare(p1_starts,
+                                                             size),
+                 'h': lambda p1_starts, size: Stonehenge(p1_starts, size),
+                 'c': lambda p1_starts, size: Chopsticks(p1_starts),
+                 'm': lambda p1_starts, size: MultiSubtractSquare(p1_starts,
+                                                                  size)}
+
+
+# The size of each game when none is given, and the largest start number
+# and side length make_game accepts.
+default_sizes = {'s': 20, 'h': 3, 'c': None, 'm': (3, 4, 5)}
+MAX_START_NUMBER = 10 ** 6
+MAX_SIDE_LENGTH = 20
+
+
+def check_size(code: str, size: Any) -> Any:
+    """Return size as the game with code code takes it, raising
+    ValueError if it is not a size of that game.
+    >>> check_size('m', [3, 4])
+    (3, 4)
+    >>> check_size('h', 0)
+    Traceback (most recent call last):
+    ...
+    ValueError: the size of game h must be a number from 1 to 20, not 0
+    """
+    if code == 'c':
+        return None
+    if code == 'm':
+        if isinstance(size, int) and not isinstance(size, bool):
+            size = (size,)
+        if (not isinstance(size, (list, tuple)) or not size or not all(
+                isinstance(number, int) and not isinstance(number, bool)
+                and 0 <= number <= MAX_START_NUMBER for number in size)):
+            raise ValueError('the size of game m must be a list of numbers '
+                             'from 0 to {}, not {}'.format(MAX_START_NUMBER,
+                                                           size))
+        return tuple(size)
+    largest = MAX_SIDE_LENGTH if code == 'h' else MAX_START_NUMBER
+    if (not isinstance(size, int) or isinstance(size, bool)
+            or not 1 <= size <= largest):
+        raise ValueError('the size of game {} must be a number from 1 to {}, '
+                         'not {}'.format(code, largest, size))
+    return size
+
+
+def make_game(code: str, size: Any = None, p1_starts: bool = True) -> Any:
+    """Return a new game of the kind with code code in playable_games, of
+    size size, or its size in default_sizes if size is None, without
+    asking for input. Raises ValueError if size is not a size of the game.
+    >>> print(make_game('s').current_state)
+    p1 turn to move. Current number is 20
+    """
+    if size is None:
+        size = default_sizes[code]
+    return game_builders[code](p1_starts, check_size(code, size))
+
+
+# Print the time each move took, and search statistics for strategies
+# that collect them.
+SHOW_SEARCH_STATS = False
+
+# Run the computer strategies under a profiler, printing its report after
+# every move: None, 'cprofile' or 'tracemalloc'.
+PROFILER = None
 
 
 class GameInterface:
@@ -25,7 +121,9 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any],
+                 report: Optional[Callable[[str], Any]] = None,
+                 p1_starts: Optional[bool] = None) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
@@ -37,15 +135,59 @@ class GameInterface:
         :type p1_strategy:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
+        :param report: If given, called with a line giving the time and
+            search statistics of every move, e.g. print or logging.info.
+        :type report:
+        :param p1_starts: Whether Player 1 makes the first move; asked
+            for if it is not given.
+        :type p1_starts:
         """
-        first_player = input("Type y if player 1 is to make the first move: ")
-        is_p1_turn = False
-        if first_player.lower() == 'y':
-            is_p1_turn = True
+        if p1_starts is None:
+            first_player = input(
+                "Type y if player 1 is to make the first move: ")
+            is_p1_turn = False
+            if first_player.lower() == 'y':
+                is_p1_turn = True
+        else:
+            is_p1_turn = p1_starts
 
         self.game = game(is_p1_turn)
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
+        # kept for the whole game, so searches can reuse earlier work; only
+        # made if a strategy uses it
+        self.transposition_table = None
+        if any(getattr(strategy, 'uses_table', False)
+               for strategy in (p1_strategy, p2_strategy)):
+            self.transposition_table = TranspositionTable()
+        self.report = report
+
+    def pick_move(self, collect_stats: bool = False
+                  ) -> Tuple[Any, float, Optional[SearchStats]]:
+        """
+        Ask the strategy of the player to move for a move, until it gives a
+        legal one. Return the move, the seconds the last try took, and its
+        search statistics if collect_stats is True and the strategy
+        collects them.
+        """
+        current_state = self.game.current_state
+        move_to_make = None
+        while not current_state.is_valid_move(move_to_make):
+            current_strategy = self.p2_strategy
+            if current_state.get_current_player_name() == 'p1':
+                current_strategy = self.p1_strategy
+            options = {}
+            if getattr(current_strategy, 'uses_table', False):
+                options['table'] = self.transposition_table
+            stats = None
+            if (collect_stats and
+                    getattr(current_strategy, 'collects_stats', False)):
+                stats = SearchStats()
+                options['stats'] = stats
+            start = time.perf_counter()
+            move_to_make = current_strategy(self.game, **options)
+            seconds = time.perf_counter() - start
+        return move_to_make, seconds, stats
 
     def play(self) -> None:
         """
@@ -58,8 +200,6 @@ class GameInterface:
 
         # Pick moves until the game is over
         while not self.game.is_over(current_state):
-            move_to_make = None
-
             # Print out all of the valid moves
             possible_moves = current_state.get_possible_moves()
             print("The current available moves are:")
@@ -67,11 +207,8 @@ class GameInterface:
                 print(move)
 
             # Pick a (legal) move.
-            while not current_state.is_valid_move(move_to_make):
-                current_strategy = self.p2_strategy
-                if current_state.get_current_player_name() == 'p1':
-                    current_strategy = self.p1_strategy
-                move_to_make = current_strategy(self.game)
+            move_to_make, seconds, stats = self.pick_move(
+                self.report is not None)
 
             # Apply the move
             current_player_name = current_state.get_current_player_name()
@@ -82,6 +219,10 @@ class GameInterface:
             print("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
             print(current_state)
+            if self.report is not None:
+                self.report("{} took {:.3f}s to move{}".format(
+                    current_player_name, seconds,
+                    ": {}".format(stats) if stats is not None else ""))
 
         # Print out the winner of the game
         if self.game.is_winner("p1"):
@@ -117,5 +258,12 @@ if __name__ == '__main__':
     while p2 not in usable_strategies.keys():
         p2 = input("Select the strategy for Player 2 ({}): ".format(strategies))
 
-    GameInterface(playable_games[chosen_game], usable_strategies[p1],
-                  usable_strategies[p2]).play()
+    p1_strategy = usable_strategies[p1]
+    p2_strategy = usable_strategies[p2]
+    if PROFILER is not None:
+        if p1_strategy is not interactive_strategy:
+            p1_strategy = profiled(p1_strategy, PROFILER)
+        if p2_strategy is not interactive_strategy:
+            p2_strategy = profiled(p2_strategy, PROFILER)
+    GameInterface(playable_games[chosen_game], p1_strategy, p2_strategy,
+                  print if SHOW_SEARCH_STATS else None).play()
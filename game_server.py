@@ -0,0 +1,498 @@
+"""A server that hosts many games at once, of every kind in playable_games,
+between people and computer strategies.
+
+Each game is a Match with its own number. People send their moves as
+messages; moves of computer strategies are picked in a thread pool, or
+a process pool, so a slow search only holds up its own game while the
+server keeps answering messages for the others. The time every move
+took to arrive after it was due is kept, and reported per player.
+
+The server can be used in the same process through the coroutines of
+GameServer, or over a local socket, with one JSON message per line:
+    {"op": "new", "game": "h", "size": 3, "p1": "i", "p2": "ab"}
+    {"op": "move", "game_id": 1, "move": "A"}
+    {"op": "state", "game_id": 1}
+    {"op": "latency", "game_id": 1}
+    {"op": "wait", "game_id": 1}
+    {"op": "list"}
+    {"op": "close", "game_id": 1}
+Players are strategy codes from usable_strategies, where 'i' is a person
+sending moves. Every reply has "ok", and "error" if it is false. The
+messages of a connection are answered as soon as each is done, not in
+the order they came in, so a message may have an "id", which is copied
+into its reply.
+
+Run it as
+    python game_server.py [--port 8765] [--workers 4] [--processes]
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+import argparse
+import asyncio
+import copy
+import json
+import multiprocessing
+import time
+from game_interface import (check_size, default_sizes, make_game,
+                            playable_games, usable_strategies)
+from transposition_table import TranspositionTable
+
+# Most memory the transposition table of one match may take. It is an
+# 'lru' table, so it only takes what the positions stored in it need.
+MATCH_TABLE_BYTES = 64 << 20
+
+
+def _private_game(game: Any) -> Any:
+    """Return a copy of game with a copy of its current state, for a
+    strategy to search. Strategies like inplace_minimax make moves on the
+    state they are given, and the state of the match must not change
+    under the messages reading it.
+    >>> game = make_game('h', 2)
+    >>> private = _private_game(game)
+    >>> private.current_state.push('A')
+    >>> game.current_state.get_possible_moves()
+    ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    """
+    private = copy.copy(game)
+    state = game.current_state
+    if hasattr(state, 'to_bytes'):
+        private.current_state = type(state).from_bytes(state.to_bytes())
+    else:
+        private.current_state = copy.deepcopy(state)
+    return private
+
+
+def _strategy_move(game: Any, code: str,
+                   table: Optional[TranspositionTable] = None
+                   ) -> Tuple[Any, float]:
+    """Return the move the strategy with code code picks in game, and the
+    seconds it took, giving it table if it uses one. This is what the
+    executors run, so it is at module level for process pools."""
+    strategy = usable_strategies[code]
+    options = {}
+    if table is not None and getattr(strategy, 'uses_table', False):
+        options['table'] = table
+    start = time.perf_counter()
+    move = strategy(game, **options)
+    return move, time.perf_counter() - start
+
+
+class Match:
+    """One game hosted by a GameServer.
+
+    players maps 'p1' and 'p2' to strategy codes, 'i' for a person.
+    table is kept between the moves of the strategies that use one, or
+    is None if neither does or tables are not shared. error says why the
+    match was stopped if a strategy failed, and is None otherwise.
+    history has a record of every move made: the player, the move, the
+    seconds the strategy took (None for people) and the latency, the
+    seconds from the move being due until it was made.
+    """
+    game_id: int
+    code: str
+    size: Any
+    game: Any
+    players: Dict[str, str]
+    table: Optional[TranspositionTable]
+    error: Optional[str]
+    history: List[Dict[str, Any]]
+    due: float
+    lock: asyncio.Lock
+    task: Optional[Any]
+
+    def __init__(self, game_id: int, code: str, size: Any, p1: str, p2: str,
+                 p1_starts: bool, share_table: bool = True) -> None:
+        """Initializes match game_id, a new game with code code and size
+        size between players p1 and p2. A table is only made if
+        share_table is True and one of the strategies uses it.
+        >>> Match(1, 's', 10, 'i', 'sq', True).table is None
+        True
+        >>> Match(1, 's', 10, 'i', 'ab', True, False).table is None
+        True
+        >>> len(Match(1, 's', 10, 'i', 'ab', True).table)
+        0
+        """
+        self.game_id = game_id
+        self.code = code
+        self.size = size
+        self.game = make_game(code, size, p1_starts)
+        self.players = {'p1': p1, 'p2': p2}
+        if share_table and any(
+                getattr(usable_strategies[player], 'uses_table', False)
+                for player in (p1, p2)):
+            self.table = TranspositionTable(max_bytes=MATCH_TABLE_BYTES,
+                                            policy='lru')
+        else:
+            self.table = None
+        self.error = None
+        self.history = []
+        self.due = time.perf_counter()
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    def to_move(self) -> str:
+        """Return the name of the player to move, 'p1' or 'p2'."""
+        return self.game.current_state.get_current_player_name()
+
+    def is_over(self) -> bool:
+        """Return whether the game is over."""
+        return self.game.is_over(self.game.current_state)
+
+    def computer_to_move(self) -> bool:
+        """Return whether the game is going and a strategy is to move."""
+        return (self.error is None and not self.is_over()
+                and self.players[self.to_move()] != 'i')
+
+    def play(self, move: Any, seconds: Optional[float]) -> None:
+        """Make move for the player to move, where the strategy took
+        seconds to pick it."""
+        now = time.perf_counter()
+        self.history.append({'player': self.to_move(), 'move': move,
+                             'seconds': seconds, 'latency': now - self.due})
+        self.game.current_state = self.game.current_state.make_move(move)
+        self.due = now
+
+    def winner(self) -> Optional[str]:
+        """Return 'p1' or 'p2' if they have won, else None."""
+        for player in ('p1', 'p2'):
+            if self.game.is_winner(player):
+                return player
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        """Return what a player needs to know about this match. It is
+        not ok, and has the error, if the match was stopped."""
+        over = self.is_over()
+        summary = {'ok': self.error is None, 'game_id': self.game_id,
+                   'game': self.code, 'players': self.players,
+                   'state': str(self.game.current_state),
+                   'to_move': None if over else self.to_move(),
+                   'moves': ([] if over else
+                             self.game.current_state.get_possible_moves()),
+                   'over': over, 'winner': self.winner() if over else None,
+                   'history': [record['move'] for record in self.history]}
+        if self.error is not None:
+            summary['error'] = self.error
+        return summary
+
+    def latency(self) -> Dict[str, Any]:
+        """Return the number of moves, the mean and longest latency and
+        the mean time the strategy took, of each player's moves.
+        >>> match = Match(1, 's', 10, 'i', 'i', True)
+        >>> match.history = [{'player': 'p1', 'move': '1', 'seconds': \
+None, 'latency': 2.0}, {'player': 'p2', 'move': '4', 'seconds': 0.5, \
+'latency': 0.75}]
+        >>> match.latency()['p2']
+        {'moves': 1, 'mean': 0.75, 'max': 0.75, 'mean_seconds': 0.5}
+        """
+        report = {}
+        for player in ('p1', 'p2'):
+            records = [record for record in self.history
+                       if record['player'] == player]
+            latencies = [record['latency'] for record in records]
+            seconds = [record['seconds'] for record in records
+                       if record['seconds'] is not None]
+            report[player] = {
+                'moves': len(records),
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'max': max(latencies, default=None),
+                'mean_seconds': (sum(seconds) / len(seconds) if seconds
+                                 else None)}
+        return report
+
+
+class GameServer:
+    """Hosts any number of matches at once.
+
+    Computer moves are picked by executor, a thread pool unless another
+    executor is given. With a process pool, strategies cannot keep their
+    transposition table between moves, since it would be copied to
+    another process every move. The processes of the pool should be
+    spawned rather than forked: a process forked while clients are
+    connected keeps their sockets open, so closing a connection does not
+    reach the client.
+    >>> loop = asyncio.new_event_loop()
+    >>> server = GameServer()
+    >>> reply = loop.run_until_complete(server.new_game('s', 10, 'i', 'sq'))
+    >>> reply['game_id'], reply['to_move'], reply['moves']
+    (1, 'p1', ['1', '4', '9'])
+    >>> reply = loop.run_until_complete(server.move(1, '1'))
+    >>> reply['history'], reply['to_move']
+    (['1', '9'], None)
+    >>> reply['winner']
+    'p2'
+    >>> loop.run_until_complete(server.handle({'op': 'move', 'game_id': 1, \
+'move': '1'}))
+    {'ok': False, 'error': 'game 1 is over'}
+    >>> loop.close()
+    """
+    matches: Dict[int, Match]
+    executor: Executor
+
+    def __init__(self, executor: Optional[Executor] = None) -> None:
+        """Initializes a server with no matches, picking computer moves
+        with executor."""
+        self.matches = {}
+        self.executor = executor or ThreadPoolExecutor()
+        self._share_tables = not isinstance(self.executor,
+                                            ProcessPoolExecutor)
+        self._next_id = 1
+
+    def _match(self, game_id: int) -> Match:
+        """Return match game_id, raising ValueError if there is none."""
+        if game_id not in self.matches:
+            raise ValueError('no game {}'.format(game_id))
+        return self.matches[game_id]
+
+    async def new_game(self, game: str, size: Any = None, p1: str = 'i',
+                       p2: str = 'i', p1_starts: bool = True,
+                       wait: bool = True) -> Dict[str, Any]:
+        """Start a game with code game and size size between the
+        strategies with codes p1 and p2, and return its summary once a
+        person is to move or the game is over. If wait is False, return
+        at once and let the strategies play in the background. Raises
+        ValueError if the game needs a size and size is missing or not a
+        size of the game, since the game would otherwise ask for one on
+        the server's input.
+        >>> loop = asyncio.new_event_loop()
+        >>> server = GameServer()
+        >>> loop.run_until_complete(server.handle({'op': 'new', \
+'game': 's'}))
+        {'ok': False, 'error': 'game s needs a size'}
+        >>> loop.run_until_complete(server.handle({'op': 'new', \
+'game': 'h', 'size': 'big'}))['error']
+        'the size of game h must be a number from 1 to 20, not big'
+        >>> loop.close()
+        """
+        if game not in playable_games:
+            raise ValueError('unknown game {}'.format(game))
+        for player in (p1, p2):
+            if player not in usable_strategies:
+                raise ValueError('unknown strategy {}'.format(player))
+        if size is None and default_sizes[game] is not None:
+            raise ValueError('game {} needs a size'.format(game))
+        size = check_size(game, size)
+        match = Match(self._next_id, game, size, p1, p2, p1_starts,
+                      self._share_tables)
+        self.matches[match.game_id] = match
+        self._next_id += 1
+        match.task = asyncio.ensure_future(self._play_computers(match))
+        if wait:
+            await match.task
+        return match.summary()
+
+    async def move(self, game_id: int, move: Any) -> Dict[str, Any]:
+        """Make move for the person to move in match game_id, and return
+        its summary once a person is to move again or the game is over.
+        """
+        match = self._match(game_id)
+        async with match.lock:
+            if match.error is not None:
+                raise ValueError('game {} was stopped: {}'.format(
+                    game_id, match.error))
+            if match.is_over():
+                raise ValueError('game {} is over'.format(game_id))
+            if match.players[match.to_move()] != 'i':
+                raise ValueError('it is not a person\'s turn in game {}'
+                                 .format(game_id))
+            move = match.game.str_to_move(str(move))
+            if not match.game.current_state.is_valid_move(move):
+                raise ValueError('{} is not a valid move'.format(move))
+            match.play(move, None)
+        match.task = asyncio.ensure_future(self._play_computers(match))
+        await match.task
+        return match.summary()
+
+    async def _play_computers(self, match: Match) -> None:
+        """Make the moves of the strategies in match until a person is to
+        move or the game is over. If a strategy fails, the match is
+        stopped with the error, instead of the error being raised.
+        >>> loop = asyncio.new_event_loop()
+        >>> usable_strategies['broken'] = lambda game: 1 / 0
+        >>> reply = loop.run_until_complete(GameServer().handle({'op': \
+'new', 'game': 'c', 'p1': 'broken', 'p2': 'i'}))
+        >>> del usable_strategies['broken']
+        >>> reply['ok'], reply['error']
+        (False, 'the move of p1 failed: ZeroDivisionError: division by zero')
+        >>> loop.close()
+        """
+        loop = asyncio.get_event_loop()
+        async with match.lock:
+            player = None
+            try:
+                while match.computer_to_move():
+                    player = match.to_move()
+                    code = match.players[player]
+                    move, seconds = await loop.run_in_executor(
+                        self.executor, _strategy_move,
+                        _private_game(match.game), code, match.table)
+                    if not match.game.current_state.is_valid_move(move):
+                        raise ValueError('strategy {} made the invalid '
+                                         'move {}'.format(code, move))
+                    match.play(move, seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                match.error = 'the move of {} failed: {}: {}'.format(
+                    player, type(error).__name__, error)
+
+    def state(self, game_id: int) -> Dict[str, Any]:
+        """Return the summary of match game_id."""
+        return self._match(game_id).summary()
+
+    async def wait(self, game_id: int) -> Dict[str, Any]:
+        """Return the summary of match game_id once its strategies have
+        made their moves."""
+        match = self._match(game_id)
+        if match.task is not None:
+            await match.task
+        return match.summary()
+
+    def latency(self, game_id: int) -> Dict[str, Any]:
+        """Return the latency report of match game_id."""
+        return {'ok': True, 'game_id': game_id,
+                'latency': self._match(game_id).latency()}
+
+    def list_games(self) -> Dict[str, Any]:
+        """Return the number, game and state of play of every match."""
+        return {'ok': True, 'games': [
+            {'game_id': match.game_id, 'game': match.code,
+             'players': match.players, 'over': match.is_over()}
+            for match in self.matches.values()]}
+
+    def close(self, game_id: int) -> Dict[str, Any]:
+        """Stop hosting match game_id."""
+        match = self._match(game_id)
+        if match.task is not None:
+            match.task.cancel()
+        del self.matches[game_id]
+        return {'ok': True, 'game_id': game_id}
+
+    async def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the reply to message, a request in the form described
+        in this module's docstring.
+        >>> loop = asyncio.new_event_loop()
+        >>> server = GameServer()
+        >>> loop.run_until_complete(server.handle({'op': 'new', \
+'game': 'c', 'p1': 'i', 'p2': 'i'}))['moves']
+        ['ll', 'lr', 'rl', 'rr']
+        >>> loop.run_until_complete(server.handle({'op': 'jump'}))
+        {'ok': False, 'error': 'unknown op jump'}
+        >>> loop.close()
+        """
+        try:
+            op = message.get('op')
+            if op == 'new':
+                return await self.new_game(
+                    message['game'], message.get('size'),
+                    message.get('p1', 'i'), message.get('p2', 'i'),
+                    message.get('p1_starts', True), message.get('wait', True))
+            if op == 'move':
+                return await self.move(message['game_id'], message['move'])
+            if op == 'wait':
+                return await self.wait(message['game_id'])
+            if op == 'state':
+                return self.state(message['game_id'])
+            if op == 'latency':
+                return self.latency(message['game_id'])
+            if op == 'list':
+                return self.list_games()
+            if op == 'close':
+                return self.close(message['game_id'])
+            raise ValueError('unknown op {}'.format(op))
+        except asyncio.CancelledError:
+            raise
+        except KeyError as error:
+            return {'ok': False, 'error': 'missing {}'.format(error)}
+        except (ValueError, TypeError) as error:
+            return {'ok': False, 'error': str(error)}
+        except Exception as error:
+            return {'ok': False, 'error': '{}: {}'.format(
+                type(error).__name__, error)}
+
+    async def _serve_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """Answer the messages of one connection, one line each, until it
+        is closed. Each message is answered in its own task, so a client
+        waiting on one game can still play in others."""
+        write_lock = asyncio.Lock()
+
+        async def answer(line: bytes) -> None:
+            """Handle the message in line and write the reply."""
+            try:
+                message = json.loads(line.decode())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                reply = {'ok': False,
+                         'error': 'messages must be JSON objects'}
+            else:
+                reply = await self.handle(message)
+                if 'id' in message:
+                    reply['id'] = message['id']
+            async with write_lock:
+                writer.write(json.dumps(reply, default=str).encode()
+                             + b'\n')
+                await writer.drain()
+
+        pending = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                pending.append(asyncio.ensure_future(answer(line)))
+        if pending:
+            await asyncio.wait(pending)
+        writer.close()
+
+    async def start(self, host: str = '127.0.0.1',
+                    port: int = 8765) -> Any:
+        """Start answering connections on host and port, and return the
+        asyncio server doing it.
+        >>> loop = asyncio.new_event_loop()
+        >>> server = GameServer()
+        >>> listening = loop.run_until_complete(server.start(port=0))
+        >>> port = listening.sockets[0].getsockname()[1]
+        >>> async def ask(line):
+        ...     reader, writer = await asyncio.open_connection(
+        ...         '127.0.0.1', port)
+        ...     writer.write(line)
+        ...     writer.write_eof()
+        ...     reply = await reader.readline()
+        ...     await reader.read()
+        ...     writer.close()
+        ...     return json.loads(reply.decode())
+        >>> loop.run_until_complete(ask(b'{"op": "new", "game": "s", \
+"size": 5, "id": 7}\\n'))['id']
+        7
+        >>> listening.close()
+        >>> loop.run_until_complete(listening.wait_closed())
+        >>> loop.close()
+        """
+        return await asyncio.start_server(self._serve_client, host, port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='threads or processes picking computer moves')
+    parser.add_argument('--processes', action='store_true',
+                        help='pick computer moves in processes')
+    options = parser.parse_args()
+    pool = (ProcessPoolExecutor(options.workers,
+                                mp_context=multiprocessing.get_context(
+                                    'spawn'))
+            if options.processes else ThreadPoolExecutor(options.workers))
+    event_loop = asyncio.get_event_loop()
+    event_loop.run_until_complete(GameServer(pool).start(options.host,
+                                                         options.port))
+    print('serving on {}:{}'.format(options.host, options.port))
+    try:
+        event_loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    pool.shutdown()
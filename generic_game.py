@@ -84,6 +84,16 @@ class CurrentState:
         """Makes the move given."""
         raise NotImplementedError("Available in subclass.")
 
+    def push(self, move: str) -> None:
+        """Makes the move given on this state itself. Only available
+        in subclasses of CurrentState."""
+        raise NotImplementedError("Available in subclass.")
+
+    def pop(self) -> None:
+        """Takes back the last move made with push. Only available
+        in subclasses of CurrentState."""
+        raise NotImplementedError("Available in subclass.")
+
     def is_valid_move(self, move: str) -> bool:
         """returns True iff move given is valid.
         Only available in subclasses of CurrentState."""
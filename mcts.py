@@ -0,0 +1,174 @@
+"""
+Monte Carlo tree search (UCT), a strategy for games too big for the
+minimax strategies in strategy.py to search.
+"""
+from array import array
+from typing import Any, List, Optional
+import math
+import os
+import random
+import time
+from strategy import terminal_value, process_pool
+
+# Default number of random playouts per move.
+DEFAULT_PLAYOUTS = 2000
+
+# How much UCT favours trying less visited moves over moves that have
+# done well so far.
+EXPLORATION = 1.4
+
+# Playouts run from each new node, so the cost of walking down the tree
+# is shared by several playouts.
+PLAYOUTS_PER_NODE = 4
+
+
+class SearchTree:
+    """The statistics of a Monte Carlo tree search, in flat arrays indexed
+    by node number. Node 0 is the root.
+
+    The children of node i are the num_children[i] nodes starting at
+    first_child[i] (-1 until node i is expanded). moves[i] is the move
+    that leads to node i from its parent. visits[i] is how many playouts
+    went through node i, and wins[i] how many of them were won by the
+    player who made moves[i], counting a tie as half a win.
+    >>> t = SearchTree()
+    >>> t.expand(0, ['A', 'B'])
+    >>> list(t.children(0)), t.moves[2]
+    ([1, 2], 'B')
+    """
+    first_child: array
+    num_children: array
+    visits: array
+    wins: array
+    moves: List[Any]
+
+    def __init__(self) -> None:
+        """Initializes a tree holding only the root."""
+        self.first_child = array('l', [-1])
+        self.num_children = array('l', [0])
+        self.visits = array('d', [0])
+        self.wins = array('d', [0])
+        self.moves = [None]
+
+    def expand(self, node: int, moves: List[Any]) -> None:
+        """Give node one new child for each move in moves."""
+        self.first_child[node] = len(self.moves)
+        self.num_children[node] = len(moves)
+        for move in moves:
+            self.first_child.append(-1)
+            self.num_children.append(0)
+            self.visits.append(0)
+            self.wins.append(0)
+            self.moves.append(move)
+
+    def children(self, node: int) -> range:
+        """Return the node numbers of the children of node."""
+        first = self.first_child[node]
+        return range(first, first + self.num_children[node])
+
+    def select(self, node: int) -> int:
+        """Return the child of node to follow next: an unvisited child if
+        there is one, otherwise the child with the best UCT score."""
+        log_visits = math.log(self.visits[node])
+        best_child = -1
+        best_score = -1.0
+        for child in self.children(node):
+            visits = self.visits[child]
+            if visits == 0:
+                return child
+            score = (self.wins[child] / visits
+                     + EXPLORATION * math.sqrt(log_visits / visits))
+            if score > best_score:
+                best_child = child
+                best_score = score
+        return best_child
+
+
+def search(game: Any, playouts: int = DEFAULT_PLAYOUTS,
+           time_limit: Optional[float] = None,
+           seed: Optional[int] = None) -> SearchTree:
+    """Run a Monte Carlo tree search from the current state of game, until
+    playouts playouts are done or time_limit seconds have passed, and
+    return the search tree."""
+    rng = random.Random(seed)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    tree = SearchTree()
+    done = 0
+    while done < playouts and (deadline is None
+                               or time.perf_counter() < deadline):
+        # walk down the tree, remembering who made the move into each node
+        state = game.current_state
+        node = 0
+        path = [(0, None)]
+        while tree.first_child[node] != -1 and not game.is_over(state):
+            mover = state.get_current_player_name()
+            node = tree.select(node)
+            state = state.make_move(tree.moves[node])
+            path.append((node, mover))
+        # add the children of the node reached, and step into one of them
+        if not game.is_over(state):
+            tree.expand(node, state.get_possible_moves())
+            mover = state.get_current_player_name()
+            node = tree.first_child[node]
+            state = state.make_move(tree.moves[node])
+            path.append((node, mover))
+        # play it out at random a few times; p1_wins counts ties as half
+        p1_wins = 0.0
+        for _ in range(PLAYOUTS_PER_NODE):
+            p1_wins += _playout(game, state, rng)
+        for node, mover in path:
+            tree.visits[node] += PLAYOUTS_PER_NODE
+            if mover == 'p1':
+                tree.wins[node] += p1_wins
+            elif mover is not None:
+                tree.wins[node] += PLAYOUTS_PER_NODE - p1_wins
+        done += PLAYOUTS_PER_NODE
+    return tree
+
+
+def _playout(game: Any, state: Any, rng: random.Random) -> float:
+    """Play random moves from state until the game is over, and return 1
+    if p1 wins, 0 if p2 wins and 0.5 for a tie."""
+    while not game.is_over(state):
+        state = state.make_move(rng.choice(state.get_possible_moves()))
+    score = terminal_value(game, state)
+    if state.get_current_player_name() == 'p2':
+        score = -score
+    return (score + 1) / 2
+
+
+def root_visits(game: Any, playouts: int, time_limit: Optional[float],
+                seed: Optional[int]) -> List[float]:
+    """Run search, and return the visit count of each move of the current
+    state of game, in the order of get_possible_moves."""
+    tree = search(game, playouts, time_limit, seed)
+    visits = [tree.visits[child] for child in tree.children(0)]
+    return visits + [0] * (len(game.current_state.get_possible_moves())
+                           - len(visits))
+
+
+def mcts_strategy(game: Any, playouts: int = DEFAULT_PLAYOUTS,
+                  time_limit: Optional[float] = None,
+                  workers: int = 1) -> Any:
+    """Return the move visited most by a Monte Carlo tree search of
+    playouts playouts, or of time_limit seconds if that runs out first.
+    With more than one worker, each worker process runs its own search
+    with playouts playouts, and their visit counts are added together.
+    """
+    moves = game.current_state.get_possible_moves()
+    if workers <= 1:
+        visits = root_visits(game, playouts, time_limit, None)
+    else:
+        pool = process_pool(workers)
+        futures = [pool.submit(root_visits, game, playouts, time_limit,
+                               int.from_bytes(os.urandom(4), 'big'))
+                   for _ in range(workers)]
+        visits = [0] * len(moves)
+        for future in futures:
+            visits = [a + b for a, b in zip(visits, future.result())]
+    return moves[visits.index(max(visits))]
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,245 @@
+"""Implementation of Multi Subtract Square, a sum of Subtract Square games,
+and a strategy that plays it perfectly with Sprague-Grundy numbers.
+
+There are several numbers (heaps). A move subtracts an allowed amount,
+by default a square, from any one heap, and the player who cannot move
+loses. Every heap size has a Grundy number, worked out once and kept by
+a GrundyEngine; a position is lost for the player to move exactly when
+the Grundy numbers of its heaps XOR to 0.
+"""
+from array import array
+from typing import Any, List, Optional, Sequence, Tuple
+import threading
+from generic_game import GenericGame, CurrentState
+from subtract_square import SubtractSquareState
+
+
+class GrundyEngine:
+    """The Grundy numbers of single heaps, where a move subtracts an
+    amount in subtraction_set (squares if it is None) from the heap.
+    values[n] is the Grundy number of a heap of size n; values are
+    worked out as far as they are needed, and kept.
+    >>> e = GrundyEngine()
+    >>> [e.grundy(n) for n in range(10)]
+    [0, 1, 0, 1, 2, 0, 1, 0, 1, 2]
+    >>> e.position_value([4, 9])
+    0
+    >>> e.winning_move([4, 8])
+    (0, 1)
+    >>> GrundyEngine((1, 2)).grundy(5)
+    2
+    >>> GrundyEngine((1, 0))
+    Traceback (most recent call last):
+    ...
+    ValueError: amounts to subtract must be positive integers, not (1, 0)
+    """
+    subtraction_set: Optional[Tuple[int, ...]]
+    values: array
+    _lock: threading.Lock
+
+    def __init__(self,
+                 subtraction_set: Optional[Sequence[int]] = None) -> None:
+        """Initializes an engine for subtraction_set, or for squares if it
+        is None. Raises ValueError unless every amount in subtraction_set
+        is a positive integer."""
+        if subtraction_set is not None and not all(
+                isinstance(amount, int) and amount > 0
+                for amount in subtraction_set):
+            raise ValueError('amounts to subtract must be positive '
+                             'integers, not {}'.format(tuple(subtraction_set)))
+        self.subtraction_set = (None if subtraction_set is None
+                                else tuple(sorted(set(subtraction_set))))
+        self.values = array('H')
+        # held while values grows, since engines are shared by threads
+        self._lock = threading.Lock()
+
+    def amounts(self, heap: int) -> List[int]:
+        """Return the amounts that can be subtracted from a heap of size
+        heap, smallest first."""
+        if self.subtraction_set is None:
+            return [int(move) for move in
+                    SubtractSquareState(number=heap).get_possible_moves()]
+        return [amount for amount in self.subtraction_set if amount <= heap]
+
+    def grundy(self, heap: int) -> int:
+        """Return the Grundy number of a heap of size heap."""
+        values = self.values
+        if heap < len(values):
+            return values[heap]
+        amounts = self.amounts(heap)
+        with self._lock:
+            for size in range(len(values), heap + 1):
+                reachable = set()
+                for amount in amounts:
+                    if amount > size:
+                        break
+                    reachable.add(values[size - amount])
+                mex = 0
+                while mex in reachable:
+                    mex += 1
+                values.append(mex)
+        return values[heap]
+
+    def position_value(self, heaps: Sequence[int]) -> int:
+        """Return the XOR of the Grundy numbers of heaps; the position is
+        lost for the player to move iff this is 0."""
+        total = 0
+        for heap in heaps:
+            total ^= self.grundy(heap)
+        return total
+
+    def winning_move(self, heaps: Sequence[int]) -> Optional[Tuple[int,
+                                                                   int]]:
+        """Return (heap index, amount) of a move from heaps that leaves a
+        lost position, or None if the position is already lost."""
+        total = self.position_value(heaps)
+        if total == 0:
+            return None
+        for index, heap in enumerate(heaps):
+            target = total ^ self.grundy(heap)
+            if target < self.grundy(heap):
+                for amount in self.amounts(heap):
+                    if self.grundy(heap - amount) == target:
+                        return index, amount
+        return None
+
+
+_ENGINES = {}
+
+
+def get_engine(subtraction_set: Optional[Sequence[int]] = None
+               ) -> GrundyEngine:
+    """Return the shared GrundyEngine for subtraction_set.
+    >>> get_engine() is get_engine()
+    True"""
+    key = None if subtraction_set is None else tuple(sorted(
+        set(subtraction_set)))
+    if key not in _ENGINES:
+        _ENGINES[key] = GrundyEngine(key)
+    return _ENGINES[key]
+
+
+class MultiSubtractSquare(GenericGame):
+    """Represents the game multi subtract square."""
+    current_state: 'MultiSubtractSquareState'
+
+    def __init__(self, player: bool,
+                 heaps: Optional[Sequence[int]] = None,
+                 subtraction_set: Optional[Sequence[int]] = None) -> None:
+        """Initializes the game, asking for the starting numbers if heaps
+        is not given. Amounts that can be subtracted are subtraction_set,
+        or squares if it is None."""
+        while heaps is None:
+            numbers = input("please select numbers to begin with, "
+                            "separated by spaces: ").split()
+            if numbers and all(number.isdigit() for number in numbers):
+                heaps = [int(number) for number in numbers]
+        self.current_state = MultiSubtractSquareState(
+            'p1' if player else 'p2', heaps, subtraction_set)
+
+    def get_instructions(self) -> str:
+        """returns the instructions for the game."""
+        return """Start from several numbers. Take turns subtracting a
+square from one of the numbers. Moves are written as the position of the
+number, starting from 0, then a colon, then the square; 1:4 subtracts 4
+from the second number. The player who cannot move loses."""
+
+
+class MultiSubtractSquareState(CurrentState):
+    """represents the current state of the game multi subtract square."""
+    player: str
+    heaps: Tuple[int, ...]
+    subtraction_set: Optional[Tuple[int, ...]]
+
+    def __init__(self, player: str = 'p1', heaps: Sequence[int] = (3, 4),
+                 subtraction_set: Optional[Sequence[int]] = None) -> None:
+        """initializes the state.
+        >>> s = MultiSubtractSquareState(heaps=[5, 2])
+        >>> print(s)
+        p1 turn to move. Current numbers are 5 2
+        """
+        self.player = player
+        self.heaps = tuple(heaps)
+        self.subtraction_set = get_engine(subtraction_set).subtraction_set
+        # heaps before each move made with push
+        self._undo = []
+
+    def engine(self) -> GrundyEngine:
+        """returns the GrundyEngine for this state's subtraction set."""
+        return get_engine(self.subtraction_set)
+
+    def get_possible_moves(self) -> List[str]:
+        """returns a list of all possible moves.
+        >>> MultiSubtractSquareState(heaps=[5, 2]).get_possible_moves()
+        ['0:1', '0:4', '1:1']"""
+        engine = self.engine()
+        return ['{}:{}'.format(index, amount)
+                for index, heap in enumerate(self.heaps)
+                for amount in engine.amounts(heap)]
+
+    def _after(self, move: str) -> Tuple[int, ...]:
+        """returns the heaps after move is made."""
+        index, amount = (int(part) for part in move.split(':'))
+        heaps = list(self.heaps)
+        heaps[index] -= amount
+        return tuple(heaps)
+
+    def make_move(self, move: str) -> 'MultiSubtractSquareState':
+        """makes a move. Returns a new MultiSubtractSquareState.
+        >>> s = MultiSubtractSquareState(heaps=[5, 2])
+        >>> print(s.make_move('0:4'))
+        p2 turn to move. Current numbers are 1 2"""
+        return MultiSubtractSquareState('p2' if self.player == 'p1' else 'p1',
+                                        self._after(move),
+                                        self.subtraction_set)
+
+    def push(self, move: str) -> None:
+        """makes a move on this state itself; pop takes it back."""
+        self._undo.append(self.heaps)
+        self.heaps = self._after(move)
+        self.player = 'p2' if self.player == 'p1' else 'p1'
+
+    def pop(self) -> None:
+        """takes back the last move made with push."""
+        self.heaps = self._undo.pop()
+        self.player = 'p2' if self.player == 'p1' else 'p1'
+
+    def key(self) -> Tuple[str, Tuple[int, ...], Optional[Tuple[int, ...]]]:
+        """Returns a compact key identifying this state. States with other
+        subtraction sets have other keys, so one table can hold both.
+        >>> s = MultiSubtractSquareState(heaps=[5, 2])
+        >>> s.key() == MultiSubtractSquareState(heaps=[5, 2],
+        ...                                     subtraction_set=[1, 2]).key()
+        False
+        """
+        return self.player, self.heaps, self.subtraction_set
+
+    def __hash__(self) -> int:
+        """Returns a hash of this state, consistent with __eq__."""
+        return hash(self.key())
+
+    def __eq__(self, other: Any) -> bool:
+        """Returns True iff both states have the same type, numbers,
+        subtraction set and current player."""
+        return type(self) == type(other) and self.key() == other.key()
+
+    def __str__(self) -> str:
+        """A string representation of this state."""
+        return "{} turn to move. Current numbers are {}".format(
+            self.player, ' '.join(str(heap) for heap in self.heaps))
+
+
+def grundy_strategy(game: Any) -> Any:
+    """Return a move that leaves the opponent a lost position, found from
+    the Grundy numbers of the heaps, or the first move if there is none.
+    """
+    state = game.current_state
+    move = state.engine().winning_move(state.heaps)
+    if move is None:
+        return state.get_possible_moves()[0]
+    return '{}:{}'.format(*move)
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a1_pyta.txt")
@@ -0,0 +1,186 @@
+"""Headless strategy-against-strategy matches, for testing how strong and
+how fast strategies are over many games.
+
+Games are built from their code in game_interface and a size, and played
+without any input or printing, across a pool of processes. Each finished
+game is written as one line of JSON: the moves, the winner and the time
+each move took.
+
+Run it as
+    python selfplay.py h ab mc --size 3 --games 1000 --output games.jsonl
+"""
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import functools
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from game_interface import (GameInterface, check_size, game_builders,
+                            make_game, usable_strategies)
+from strategy import shutdown_pools
+
+# Games still going after this many moves are stopped and counted as
+# unfinished, since Chopsticks positions can repeat forever.
+MAX_MOVES = 200
+
+
+def parse_size(text: Optional[str]) -> Any:
+    """Return the size given on the command line as text: a number, or
+    starting numbers separated by commas.
+    >>> parse_size('3'), parse_size('3,4,5'), parse_size(None)
+    (3, (3, 4, 5), None)
+    """
+    if text is None:
+        return None
+    if ',' in text:
+        return tuple(int(number) for number in text.split(','))
+    return int(text)
+
+
+def play_game(game_code: str, size: Any, p1: str, p2: str,
+              p1_starts: bool = True, openings: int = 0,
+              seed: Optional[int] = None) -> Dict[str, Any]:
+    """Play one game of the game with code game_code and size size, with
+    the strategies with codes p1 and p2, and return its record. The first
+    openings moves are picked at random, from a generator seeded with
+    seed, so that games between the same strategies can differ.
+    >>> record = play_game('s', 20, 'sq', 'mr')
+    >>> record['winner'], record['finished'], len(record['times'])
+    ('p2', True, 8)
+    """
+    interface = GameInterface(functools.partial(make_game, game_code, size),
+                              usable_strategies[p1], usable_strategies[p2],
+                              p1_starts=p1_starts)
+    game = interface.game
+    rng = random.Random(seed)
+    moves = []
+    times = []
+    while not game.is_over(game.current_state) and len(moves) < MAX_MOVES:
+        if len(moves) < openings:
+            move = rng.choice(game.current_state.get_possible_moves())
+            seconds = 0.0
+        else:
+            move, seconds, _ = interface.pick_move()
+        game.current_state = game.current_state.make_move(move)
+        moves.append(str(move))
+        times.append(seconds)
+    finished = game.is_over(game.current_state)
+    winner = None
+    if game.is_winner('p1'):
+        winner = 'p1'
+    elif game.is_winner('p2'):
+        winner = 'p2'
+    return {'game': game_code, 'size': size, 'p1': p1, 'p2': p2,
+            'p1_starts': p1_starts, 'seed': seed, 'openings': openings,
+            'moves': moves, 'times': times, 'finished': finished,
+            'winner': winner}
+
+
+def _play(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """play_game with keyword arguments arguments, for Executor.map."""
+    return play_game(**arguments)
+
+
+def _start_worker() -> None:
+    """Forget the process pools a worker of run_match inherited, so a
+    strategy like parallel_minimax starts its own instead of using the
+    pools of the parent process."""
+    shutdown_pools()
+
+
+def _play_in_worker(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """_play in a worker of run_match. Pools the game started are shut
+    down after it, since a worker cannot exit while its pools are
+    running."""
+    try:
+        return _play(arguments)
+    finally:
+        shutdown_pools()
+
+
+def run_match(game_code: str, size: Any, p1: str, p2: str, games: int,
+              workers: int = 1, openings: int = 0, alternate: bool = True,
+              seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Play games games between the strategies with codes p1 and p2, and
+    yield their records in order. With alternate, player 2 starts every
+    other game. Game i uses seed seed + i. With more than one worker the
+    games are played in a pool of workers processes, shut down once the
+    last record is yielded."""
+    match = [{'game_code': game_code, 'size': size, 'p1': p1, 'p2': p2,
+              'p1_starts': not alternate or number % 2 == 0,
+              'openings': openings, 'seed': seed + number}
+             for number in range(games)]
+    if workers <= 1:
+        yield from map(_play, match)
+        return
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_start_worker) as pool:
+        yield from pool.map(_play_in_worker, match,
+                            chunksize=max(1, games // (4 * workers)))
+
+
+def summary(records: List[Dict[str, Any]]) -> str:
+    """Return the wins of each player, the unfinished games and the
+    average and longest time per move of each player in records. The
+    random opening moves of each game are left out of the times.
+    >>> summary([{'winner': 'p1', 'finished': True, 'p1_starts': True, \
+'openings': 1, 'times': [0.0, 0.25, 0.5, 0.125]}])
+    'p1 won 1, p2 won 0, ties 0, unfinished 0; p1 0.500s/move (max \
+0.500s), p2 0.188s/move (max 0.250s)'
+    """
+    wins = {'p1': 0, 'p2': 0}
+    ties = 0
+    unfinished = 0
+    times = {'p1': [], 'p2': []}
+    for record in records:
+        if record['winner'] is not None:
+            wins[record['winner']] += 1
+        elif record['finished']:
+            ties += 1
+        else:
+            unfinished += 1
+        players = ('p1', 'p2') if record['p1_starts'] else ('p2', 'p1')
+        for number in range(record.get('openings', 0), len(record['times'])):
+            times[players[number % 2]].append(record['times'][number])
+    return 'p1 won {}, p2 won {}, ties {}, unfinished {}; {}'.format(
+        wins['p1'], wins['p2'], ties, unfinished, ', '.join(
+            '{} {:.3f}s/move (max {:.3f}s)'.format(
+                player, sum(times[player]) / max(1, len(times[player])),
+                max(times[player], default=0.0))
+            for player in ('p1', 'p2')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('game', choices=sorted(game_builders))
+    parser.add_argument('p1', help='strategy code of player 1')
+    parser.add_argument('p2', help='strategy code of player 2')
+    parser.add_argument('--size', help='start number, side length, or '
+                                       'starting numbers like 3,4,5; '
+                                       'each game has a default')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--openings', type=int, default=0,
+                        help='random moves at the start of each game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSONL file to write games to')
+    options = parser.parse_args()
+    if 'i' in (options.p1, options.p2):
+        parser.error('the interactive strategy cannot play headless')
+    if options.size is not None:
+        try:
+            check_size(options.game, parse_size(options.size))
+        except ValueError as error:
+            parser.error(str(error))
+    output = open(options.output, 'w') if options.output else None
+    played = []
+    for game_record in run_match(options.game, parse_size(options.size),
+                                 options.p1, options.p2, options.games,
+                                 options.workers, options.openings,
+                                 seed=options.seed):
+        played.append(game_record)
+        if output is not None:
+            output.write(json.dumps(game_record) + '\n')
+    if output is not None:
+        output.close()
+    print(summary(played))
@@ -4,6 +4,7 @@ from typing import Any, List, Optional
 
 class Tree:
     """Represents a tree"""
+    __slots__ = ('value', 'children', 'state_value', 'move_made')
     value: Any
     children: List['Tree']
     state_value: Optional[int]
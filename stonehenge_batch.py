@@ -0,0 +1,213 @@
+"""Scoring many Stonehenge positions at once, for random playouts and for
+building datasets of positions.
+
+A batch of N positions on one board is an N x cells array of int8: entry
+[i, c] is 1 or 2 if that player has claimed cell c in position i, and 0
+if it is free. The leylines are an incidence matrix, cells x leylines,
+so the cells each player has on each leyline come from one matrix
+product for the whole batch. From those, score works out who owns every
+leyline, the points of both players and which positions are over, and
+random_playouts plays many random games from one position side by side,
+making one move in all of them per step.
+
+NumPy is used if it is installed; otherwise pure Python loops over the
+positions give the same scores, only more slowly.
+"""
+from typing import Any, Optional, Sequence, Tuple
+import random
+from stonehenge_state_4 import StonehengeGeometry, StonehengeState
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_BATCHES = {}
+
+
+class StonehengeBatch:
+    """Scores batches of positions on boards with geometry geometry.
+    incidence[c][j] is 1 if cell c is on leyline j and 0 otherwise; it is
+    a NumPy array, or a list of lists without NumPy.
+    >>> from stonehenge_game import Stonehenge
+    >>> state = Stonehenge(True, 2).current_state
+    >>> after = state.make_move('A').make_move('B').make_move('C')
+    >>> batch = get_batch(state.geometry)
+    >>> cells, owners = batch.encode([state, after])
+    >>> owners, p1_points, p2_points, terminal = batch.score(cells)
+    >>> [int(points) for points in p1_points], \
+[int(points) for points in p2_points]
+    ([0, 3], [0, 1])
+    >>> [bool(over) for over in terminal]
+    [False, False]
+    """
+    geometry: StonehengeGeometry
+    incidence: Any
+
+    def __init__(self, geometry: StonehengeGeometry) -> None:
+        """Initializes the batch scorer for geometry. Use get_batch
+        instead, so the incidence matrix is only built once."""
+        self.geometry = geometry
+        incidence = [[0] * geometry.num_leylines
+                     for _ in range(geometry.num_cells)]
+        for cell, leylines in enumerate(geometry.cell_leylines):
+            for leyline in leylines:
+                incidence[cell][leyline] = 1
+        if numpy is not None:
+            self.incidence = numpy.array(incidence, dtype=numpy.int16)
+            self._needed = numpy.array(geometry.leyline_needed,
+                                       dtype=numpy.int16)
+        else:
+            self.incidence = incidence
+
+    def encode(self, states: Sequence[StonehengeState]) -> Tuple[Any, Any]:
+        """Return the cells of states as a batch, and who owns each of
+        their leylines, as an N x leylines array of 1, 2 or 0 for none.
+        """
+        geometry = self.geometry
+        cells = [[0] * geometry.num_cells for _ in states]
+        owners = [[0] * geometry.num_leylines for _ in states]
+        for row, state in enumerate(states):
+            for cell in range(geometry.num_cells):
+                if state.p1_cells >> cell & 1:
+                    cells[row][cell] = 1
+                elif state.p2_cells >> cell & 1:
+                    cells[row][cell] = 2
+            for leyline in range(geometry.num_leylines):
+                if state.p1_leylines >> leyline & 1:
+                    owners[row][leyline] = 1
+                elif state.p2_leylines >> leyline & 1:
+                    owners[row][leyline] = 2
+        if numpy is not None:
+            return (numpy.array(cells, dtype=numpy.int8).reshape(
+                len(states), geometry.num_cells),
+                    numpy.array(owners, dtype=numpy.int8).reshape(
+                        len(states), geometry.num_leylines))
+        return cells, owners
+
+    def score(self, cells: Any,
+              owners: Optional[Any] = None) -> Tuple[Any, Any, Any, Any]:
+        """Return who owns each leyline in the positions of the batch
+        cells, the points of player 1 and of player 2 in each position,
+        and whether each position is over.
+
+        A leyline goes to the player holding at least half of its cells.
+        Only the order of the moves tells who got there first when both
+        players hold half of a leyline, so owners, the owners before the
+        last move, as returned by encode or score, is kept for leylines
+        that already had one; other leylines both players hold half of go
+        to player 1.
+        """
+        geometry = self.geometry
+        win = geometry.points_to_win
+        if numpy is not None:
+            cells = numpy.asarray(cells, dtype=numpy.int8)
+            if owners is None:
+                owners = numpy.zeros((len(cells), geometry.num_leylines),
+                                     dtype=numpy.int8)
+            p1_counts = (cells == 1).astype(numpy.int16) @ self.incidence
+            p2_counts = (cells == 2).astype(numpy.int16) @ self.incidence
+            reached = numpy.where(p1_counts >= self._needed, 1,
+                                  numpy.where(p2_counts >= self._needed,
+                                              2, 0)).astype(numpy.int8)
+            owners = numpy.where(owners != 0, owners, reached)
+            p1_points = (owners == 1).sum(axis=1)
+            p2_points = (owners == 2).sum(axis=1)
+            terminal = ((p1_points >= win) | (p2_points >= win)
+                        | (cells != 0).all(axis=1))
+            return owners, p1_points, p2_points, terminal
+        new_owners = []
+        p1_points = []
+        p2_points = []
+        terminal = []
+        for row, position in enumerate(cells):
+            p1_counts = [0] * geometry.num_leylines
+            p2_counts = [0] * geometry.num_leylines
+            for cell, owner in enumerate(position):
+                counts = p1_counts if owner == 1 else p2_counts
+                if owner:
+                    for leyline in geometry.cell_leylines[cell]:
+                        counts[leyline] += 1
+            row_owners = (list(owners[row]) if owners is not None
+                          else [0] * geometry.num_leylines)
+            for leyline, needed in enumerate(geometry.leyline_needed):
+                if not row_owners[leyline]:
+                    if p1_counts[leyline] >= needed:
+                        row_owners[leyline] = 1
+                    elif p2_counts[leyline] >= needed:
+                        row_owners[leyline] = 2
+            new_owners.append(row_owners)
+            p1_points.append(row_owners.count(1))
+            p2_points.append(row_owners.count(2))
+            terminal.append(p1_points[-1] >= win or p2_points[-1] >= win
+                            or all(position))
+        return new_owners, p1_points, p2_points, terminal
+
+    def random_playouts(self, state: StonehengeState, count: int,
+                        seed: Optional[int] = None) -> Any:
+        """Play count games of random moves from state, with a generator
+        seeded with seed, and return the result of each: 1 if player 1
+        won, 0 if player 2 won and 0.5 for a tie. With NumPy the games are
+        played side by side, one move of every game still going per step.
+        >>> from stonehenge_game import Stonehenge
+        >>> state = Stonehenge(True, 3).current_state
+        >>> results = get_batch(state.geometry).random_playouts(state, 50, 0)
+        >>> len(results), all(result in (0, 0.5, 1) for result in results)
+        (50, True)
+        """
+        win = self.geometry.points_to_win
+        if numpy is None:
+            rng = random.Random(seed)
+            results = []
+            for _ in range(count):
+                playout = state
+                while not playout.is_terminal():
+                    playout = playout.make_move(
+                        rng.choice(playout.get_possible_moves()))
+                results.append(1.0 if playout.p1_points >= win else
+                               0.0 if playout.p2_points >= win else 0.5)
+            return results
+        rng = numpy.random.default_rng(seed)
+        cells, owners = self.encode([state])
+        cells = numpy.repeat(cells, count, axis=0)
+        owners = numpy.repeat(owners, count, axis=0)
+        counts = {1: numpy.repeat((cells[:1] == 1).astype(numpy.int16)
+                                  @ self.incidence, count, axis=0),
+                  2: numpy.repeat((cells[:1] == 2).astype(numpy.int16)
+                                  @ self.incidence, count, axis=0)}
+        over = numpy.repeat(self.score(cells[:1], owners[:1])[3], count)
+        # every game claims its free cells in its own random order
+        free = numpy.flatnonzero(cells[0] == 0)
+        order = free[numpy.argsort(rng.random((count, len(free))), axis=1)]
+        player = 1 if state.p1_turn else 2
+        for step in range(len(free)):
+            rows = numpy.flatnonzero(~over)
+            if len(rows) == 0:
+                break
+            claimed = order[rows, step]
+            cells[rows, claimed] = player
+            counts[player][rows] += self.incidence[claimed]
+            row_owners = owners[rows]
+            row_owners[(row_owners == 0)
+                       & (counts[player][rows] >= self._needed)] = player
+            owners[rows] = row_owners
+            over[rows] = (row_owners == player).sum(axis=1) >= win
+            player = 3 - player
+        p1_points = (owners == 1).sum(axis=1)
+        p2_points = (owners == 2).sum(axis=1)
+        return numpy.where(p1_points >= win, 1.0,
+                           numpy.where(p2_points >= win, 0.0, 0.5))
+
+
+def get_batch(geometry: StonehengeGeometry) -> StonehengeBatch:
+    """Return the shared StonehengeBatch for geometry.
+    >>> from stonehenge_state_4 import get_geometry
+    >>> get_batch(get_geometry((2, 1))) is get_batch(get_geometry((2, 1)))
+    True"""
+    if geometry.row_lengths not in _BATCHES:
+        _BATCHES[geometry.row_lengths] = StonehengeBatch(geometry)
+    return _BATCHES[geometry.row_lengths]
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
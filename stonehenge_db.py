@@ -0,0 +1,206 @@
+"""A database of solved positions for small Stonehenge boards, and a
+strategy that plays perfectly by looking positions up in it.
+
+build solves every position that can be reached on a board of a given
+side length and writes them to a file, sorted by key. Each position is a
+fixed width record: its key, its result for the player to move and the
+cell to claim. StonehengeDatabase opens the file with mmap and finds
+positions by binary search, so nothing is read or parsed up front, and
+processes that open the same file share one copy of it in memory.
+Symmetric positions are kept once, under their canonical key (see
+StonehengeState.canonical), with the cell in terms of that key's state.
+Keys are 64 bit, which is enough for side lengths 1 to 3.
+
+Run this module with side lengths as arguments to build their databases,
+e.g. python stonehenge_db.py 1 2 3
+"""
+from typing import Any, Dict, Optional, Tuple
+import mmap
+import os
+import struct
+from stonehenge_game import Stonehenge
+from stonehenge_state_4 import StonehengeState
+from strategy import alphabeta_minimax
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Folder the database files are kept in.
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAGIC = b'STHD'
+# magic, side length, number of records
+HEADER = struct.Struct('<4sII')
+# key, result for the player to move, cell to claim
+RECORD = struct.Struct('<QbB')
+
+_DATABASES = {}
+
+
+def database_path(side_length: int) -> str:
+    """Return the path of the database file for side length side_length."""
+    return os.path.join(DATABASE_DIR,
+                        'stonehenge_{}.db'.format(side_length))
+
+
+def solve(side_length: int) -> Dict[int, Tuple[int, int]]:
+    """Return a table mapping the canonical key of every position that
+    can be reached on a board of side length side_length, and is not
+    over, to its result for the player to move (WIN, LOSS or DRAW) and
+    the cell to claim in the canonical position.
+    >>> table = solve(1)
+    >>> len(table)
+    2
+    >>> state = Stonehenge(True, 1).current_state
+    >>> table[state.key()]
+    (1, 0)
+    """
+    table = {}
+    for p1_starts in (True, False):
+        state = Stonehenge(p1_starts, side_length).current_state
+        geometry = state.geometry
+        if 2 * (geometry.num_cells + geometry.num_leylines) + 1 > 64:
+            raise ValueError('side length {} is too big for 64 bit keys'
+                             .format(side_length))
+        _solve(state, table)
+    return table
+
+
+def _solve(state: StonehengeState,
+           table: Dict[int, Tuple[int, int]]) -> int:
+    """Add state and every position after it to table, and return the
+    result of state for the player to move."""
+    key, symmetry = state.canonical()
+    if key in table:
+        return table[key][0]
+    if state.is_terminal():
+        win = state.geometry.points_to_win
+        if state.p1_points >= win:
+            return WIN if state.p1_turn else LOSS
+        if state.p2_points >= win:
+            return LOSS if state.p1_turn else WIN
+        return DRAW
+    best_result = LOSS - 1
+    best_cell = 0
+    claimed = state.p1_cells | state.p2_cells
+    for cell in range(state.geometry.num_cells):
+        if claimed >> cell & 1:
+            continue
+        state.push(state.cell_label(cell))
+        result = -_solve(state, table)
+        state.pop()
+        if result > best_result:
+            best_result = result
+            best_cell = cell
+    table[key] = (best_result, state.geometry.cell_maps[symmetry][best_cell])
+    return best_result
+
+
+def write(table: Dict[int, Tuple[int, int]], side_length: int,
+          path: str) -> None:
+    """Write table, as returned by solve(side_length), to the file at
+    path."""
+    data = bytearray(HEADER.size + RECORD.size * len(table))
+    HEADER.pack_into(data, 0, MAGIC, side_length, len(table))
+    offset = HEADER.size
+    for key in sorted(table):
+        result, cell = table[key]
+        RECORD.pack_into(data, offset, key, result, cell)
+        offset += RECORD.size
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def build(side_length: int, path: Optional[str] = None) -> None:
+    """Solve side length side_length and write its database to path, or
+    to database_path(side_length) if path is not given."""
+    write(solve(side_length), side_length,
+          path or database_path(side_length))
+
+
+class StonehengeDatabase:
+    """A database file written by build, mapped into memory.
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'stonehenge_1.db')
+    >>> build(1, path)
+    >>> db = StonehengeDatabase(path)
+    >>> len(db), db.side_length
+    (2, 1)
+    >>> db.lookup(Stonehenge(True, 1).current_state)
+    (1, 'A')
+    >>> db.close()
+    """
+    side_length: int
+
+    def __init__(self, path: str) -> None:
+        """Opens the database file at path."""
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.side_length, self._size = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            self._data.close()
+            raise ValueError('{} is not a Stonehenge database'.format(path))
+
+    def __len__(self) -> int:
+        """Return the number of positions in the database."""
+        return self._size
+
+    def lookup(self, state: StonehengeState) -> Optional[Tuple[int, str]]:
+        """Return the result of state for the player to move and the best
+        move in it, or None if state is not in the database."""
+        key, symmetry = state.canonical()
+        low = 0
+        high = self._size
+        while low < high:
+            middle = (low + high) // 2
+            record = RECORD.unpack_from(self._data, HEADER.size
+                                        + middle * RECORD.size)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                cell = state.geometry.inverse_cell_maps[symmetry][record[2]]
+                return record[1], state.cell_label(cell)
+        return None
+
+    def close(self) -> None:
+        """Unmaps the database file."""
+        self._data.close()
+
+
+def open_database(side_length: int) -> Optional[StonehengeDatabase]:
+    """Return the database for side length side_length, opened once and
+    then reused, or None if it has not been built. Only databases that
+    were found are kept, so one built later is still picked up."""
+    if side_length not in _DATABASES:
+        path = database_path(side_length)
+        if not os.path.exists(path):
+            return None
+        _DATABASES[side_length] = StonehengeDatabase(path)
+    return _DATABASES[side_length]
+
+
+def stonehenge_db_strategy(game: Any) -> Any:
+    """Return the best move in the current state of the Stonehenge game
+    game, looked up in its database. Falls back on alphabeta_minimax if
+    there is no database for the board or the position is not in it.
+    """
+    state = game.current_state
+    database = open_database(len(state.geometry.row_lengths) - 1)
+    found = database.lookup(state) if database is not None else None
+    if found is None:
+        return alphabeta_minimax(game)
+    return found[1]
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        for argument in sys.argv[1:]:
+            build(int(argument))
+            print('wrote', database_path(int(argument)))
+    else:
+        from python_ta import check_all
+        check_all(config="a2_pyta.txt")
@@ -1,38 +1,42 @@
 """StoneHenge game. Subclass of game."""
+from typing import List, Optional
 from game import Game
-from stonehenge_state_4 import StonehengeState
+from stonehenge_state_4 import (StonehengeState, Move, board_labels,
+                                board_row_lengths)
+
+
+def board_rows(side_length: int) -> List[List[Move]]:
+    """Return the rows of an empty board with side length side_length, in
+    the form StonehengeState takes, with cells labelled from 'A', or with
+    integer cell ids from 0 on boards too big for letters.
+    >>> board_rows(1)
+    [['@', '@'], ['@', 'A', 'B'], ['@', 'C'], ['@', '@']]
+    >>> board_rows(6)[-2]
+    ['@', 27, 28, 29, 30, 31, 32]
+    """
+    labels = board_labels(side_length)
+    all_rows = [['@'] * (side_length + 1)]
+    start = 0
+    for length in board_row_lengths(side_length):
+        all_rows.append(['@'] + labels[start:start + length])
+        start += length
+    all_rows.append(['@'] * (side_length + 1))
+    return all_rows
+
 
 class Stonehenge(Game):
     """Implementation of the game Stonehenge."""
 
     current_state: StonehengeState
 
-    def __init__(self, p1_starts: bool) -> None:
-        """initializes the game Stonehenge."""
-        side_length = int(input("What side length board do you want?: "))
-        n = side_length + 1
-        all_rows = []
-        ascii_stuff = 64
-        for row in range(side_length):
-            new_row = []
-            num_slots = 2
-            while num_slots != row+4:
-                ascii_stuff += 1
-                new_row.append(chr(ascii_stuff))
-                num_slots += 1
-            all_rows.append(new_row)
-        new_row = []
-        num_slots = 0
-        while num_slots != side_length:
-            ascii_stuff += 1
-            new_row.append(chr(ascii_stuff))
-            num_slots += 1
-        all_rows.append(new_row)
-        for row in all_rows:
-            row.insert(0, '@')
-        all_rows.insert(0, ['@']*n)
-        all_rows.append(['@']*n)
-        self.current_state = StonehengeState(p1_starts, all_rows)
+    def __init__(self, p1_starts: bool,
+                 side_length: Optional[int] = None) -> None:
+        """initializes the game Stonehenge, asking for the side length of
+        the board if side_length is not given."""
+        if side_length is None:
+            side_length = int(input("What side length board do you want?: "))
+        self.current_state = StonehengeState(p1_starts,
+                                             board_rows(side_length))
 
     def get_instructions(self) -> str:
         """returns the instruction to the game."""
@@ -45,30 +49,29 @@ The player who gains half of the leylines first wins."""
 
     def is_over(self, state: StonehengeState) -> bool:
         """return if the game is over."""
-        if state.get_possible_moves() == []:
-            return True
-        leylines = state.get_points()
-        if leylines[True] >= leylines[2]/2:
-            return True
-        if leylines[False] >= leylines[2]/2:
-            return True
-        return False
+        return state.is_terminal()
 
     def is_winner(self, player: str) -> bool:
-        """return whether player is the winner of the game"""
-        if self.is_over(self.current_state):
-            leylines = self.current_state.get_points()
-            if (player == 'p1' and
-                    leylines[True] >= leylines[2]/2):
-                return True
-            elif (player == 'p2' and
-                  leylines[False] >= leylines[2]/2):
-                return True
+        """return whether player is the winner of the game. Reads the
+        terminal status and points the current state keeps, so asking for
+        both players costs one evaluation."""
+        state = self.current_state
+        if state.is_terminal() and player in ('p1', 'p2'):
+            leylines = state.get_points()
+            return leylines[player == 'p1'] >= leylines[2]/2
         return False
 
-    def str_to_move(self, string: str) -> str:
+    def str_to_move(self, string: str) -> Move:
         """turns a string into a move that can
-        be accepted by self.state"""
+        be accepted by self.state: a cell id on boards labelled with
+        them, else the label itself.
+        >>> Stonehenge(True, 6).str_to_move('12'), \
+Stonehenge(True, 2).str_to_move('B')
+        (12, 'B')
+        """
+        string = string.strip()
+        if string.isdigit():
+            return int(string)
         return string
 
 if __name__ == '__main__':
@@ -1,14 +1,370 @@
 """Game state for Stonehenge."""
-from typing import List, Union, Dict, Any
+from typing import List, Union, Dict, Any, Tuple, Iterable, Optional
+import textwrap
 from game_state import GameState
 
+# Cells are labelled with letters on boards small enough for them, and with
+# integer cell ids on larger ones, so moves are one or the other.
+Move = Union[str, int]
+
+# Boards with more cells than this are labelled with integer cell ids.
+MAX_LETTER_CELLS = 26
+
+# How much a leyline one cell away from being captured counts in
+# StonehengeState.evaluate, compared to a captured one.
+NEAR_WEIGHT = 0.5
+
+
+def _count_bits(mask: int) -> int:
+    """Return the number of set bits in mask.
+    >>> _count_bits(0b1011)
+    3"""
+    return bin(mask).count('1')
+
+
+class StonehengeGeometry:
+    """The layout of a Stonehenge board: which cells lie on which
+    leylines, and how many cells of a leyline a player needs to claim it.
+    It depends only on the row lengths of the board, so one instance is
+    built per board shape and shared by every state on that board.
+
+    Cells are numbered row by row, starting at 0. Leylines are numbered
+    top leylines first, then row leylines, then bottom leylines.
+
+    The symmetries of the board are the ways of moving its cells around
+    that take every leyline onto a leyline, such as mirroring each row.
+    Symmetry s moves cell i to cell_maps[s][i] and leyline j to
+    leyline_maps[s][j]; symmetry 0 leaves everything in place.
+    """
+
+    row_lengths: Tuple[int, ...]
+    num_cells: int
+    leyline_cells: List[Tuple[int, ...]]
+    leyline_masks: List[int]
+    leyline_sizes: List[int]
+    leyline_needed: List[int]
+    cell_leylines: List[Tuple[int, ...]]
+    num_leylines: int
+    points_to_win: int
+    full_mask: int
+    count_width: int
+    cell_count_steps: List[int]
+    leyline_bits: List[int]
+    cell_leyline_bits: List[int]
+    near_bias: int
+    near_mask: int
+    cell_maps: List[Tuple[int, ...]]
+    inverse_cell_maps: List[Tuple[int, ...]]
+    leyline_maps: List[Tuple[int, ...]]
+
+    def __init__(self, row_lengths: Tuple[int, ...]) -> None:
+        """Initializes the geometry of a board with the given row lengths.
+        Use get_geometry instead, so the geometry is only built once.
+
+        Per-leyline cell counts are packed into a single int, count_width
+        bits per leyline; cell_count_steps[i] is what claiming cell i adds
+        to a player's packed counts. The top bit of each leyline's count
+        is always 0 in packed counts, and is used by near_leylines to
+        mark leylines: leyline_bits[j] is that bit of leyline j, and
+        cell_leyline_bits[i] has the bits of the leylines through cell i.
+        >>> g = StonehengeGeometry((2, 3, 2))
+        >>> g.leyline_cells
+        [(0, 2), (1, 3, 5), (4, 6), (0, 1), (2, 3, 4), (5, 6), (2, 5), \
+(0, 3, 6), (1, 4)]
+        >>> g.cell_leylines[3]
+        (1, 4, 7)
+        >>> g.leyline_needed
+        [1, 2, 1, 1, 2, 1, 1, 2, 1]
+        >>> g.points_to_win
+        5
+        """
+        self.row_lengths = row_lengths
+        self.num_cells = sum(row_lengths)
+        num_rows = len(row_lengths)
+        longest = max(row_lengths)
+        top = [[] for _ in range(num_rows)]
+        middle = [[] for _ in range(num_rows)]
+        bottom = [[] for _ in range(num_rows)]
+        cell_leylines = []
+        cell = 0
+        for row_num, length in enumerate(row_lengths):
+            last_row = row_num == num_rows - 1
+            for column in range(length):
+                # same padding as make_parallelogram
+                if last_row:
+                    top_num, bottom_num = column + 1, column
+                else:
+                    top_num, bottom_num = column, column + longest - length
+                top[top_num].append(cell)
+                middle[row_num].append(cell)
+                bottom[bottom_num].append(cell)
+                cell_leylines.append((top_num, num_rows + row_num,
+                                      2 * num_rows + bottom_num))
+                cell += 1
+        self.leyline_cells = [tuple(line) for line in top + middle + bottom]
+        self.leyline_masks = [sum(1 << cell for cell in line)
+                              for line in self.leyline_cells]
+        self.leyline_sizes = [len(line) for line in self.leyline_cells]
+        self.leyline_needed = [(size + 1) // 2
+                               for size in self.leyline_sizes]
+        self.cell_leylines = cell_leylines
+        self.num_leylines = len(self.leyline_cells)
+        self.points_to_win = (self.num_leylines + 1) // 2
+        self.full_mask = (1 << self.num_cells) - 1
+        self.count_width = max(self.leyline_sizes).bit_length() + 1
+        self.cell_count_steps = [
+            sum(1 << (self.count_width * leyline) for leyline in leylines)
+            for leylines in cell_leylines]
+        top = self.count_width - 1
+        self.leyline_bits = [1 << (self.count_width * leyline + top)
+                             for leyline in range(self.num_leylines)]
+        self.cell_leyline_bits = [
+            sum(self.leyline_bits[leyline] for leyline in leylines)
+            for leylines in cell_leylines]
+        # adding this carries into the top bit of exactly the counts that
+        # are at most one short of what their leyline needs
+        self.near_bias = sum(
+            ((1 << top) - needed + 1) << (self.count_width * leyline)
+            for leyline, needed in enumerate(self.leyline_needed))
+        self.near_mask = sum(self.leyline_bits)
+        self._bit_tables = []
+        for start in range(0, self.num_leylines, 8):
+            bits = self.leyline_bits[start:start + 8]
+            self._bit_tables.append([
+                sum(bits[bit] for bit in range(len(bits)) if byte >> bit & 1)
+                for byte in range(256)])
+        self.cell_maps = self._find_symmetries()
+        self.inverse_cell_maps = [
+            tuple(sorted(range(self.num_cells), key=cell_map.__getitem__))
+            for cell_map in self.cell_maps]
+        leyline_numbers = {frozenset(line): leyline for leyline, line
+                           in enumerate(self.leyline_cells)}
+        self.leyline_maps = [
+            tuple(leyline_numbers[frozenset(cell_map[cell] for cell in line)]
+                  for line in self.leyline_cells)
+            for cell_map in self.cell_maps]
+        self._key_tables = [self._key_table(symmetry) for symmetry
+                            in range(len(self.cell_maps))]
+
+    def _find_symmetries(self) -> List[Tuple[int, ...]]:
+        """Return the cell maps of every symmetry of the board, the
+        identity first. They are found by trying, cell by cell, every
+        image that keeps cells that share a leyline sharing a leyline.
+        >>> [len(get_geometry(lengths).cell_maps) for lengths in \
+((2, 1), (2, 3, 2), (2, 3, 4, 3))]
+        [6, 12, 6]
+        >>> get_geometry((2, 3, 4, 3)).cell_maps[1]
+        (1, 0, 4, 3, 2, 8, 7, 6, 5, 11, 10, 9)
+        """
+        num_cells = self.num_cells
+        lines = set(frozenset(line) for line in self.leyline_cells)
+        neighbours = [frozenset(other for leyline in leylines
+                                for other in self.leyline_cells[leyline])
+                      for leylines in self.cell_leylines]
+        shapes = [sorted(self.leyline_sizes[leyline] for leyline in leylines)
+                  for leylines in self.cell_leylines]
+        found = []
+        images = []
+
+        def extend() -> None:
+            """Try every image for the next cell after images."""
+            cell = len(images)
+            if cell == num_cells:
+                if all(frozenset(images[c] for c in line) in lines
+                       for line in lines):
+                    found.append(tuple(images))
+                return
+            for image in range(num_cells):
+                if (shapes[image] == shapes[cell] and image not in images
+                        and all((other in neighbours[cell])
+                                == (images[other] in neighbours[image])
+                                for other in range(cell))):
+                    images.append(image)
+                    extend()
+                    images.pop()
+        extend()
+        return found
+
+    def _key_table(self, symmetry: int) -> List[List[int]]:
+        """Return tables for map_key: entry [i][b] is where symmetry moves
+        the bits b of byte i of a StonehengeState key."""
+        cell_map = self.cell_maps[symmetry]
+        leyline_map = self.leyline_maps[symmetry]
+        # bit 0 is the player to move, then the cells of each player, then
+        # the leylines of each player; see StonehengeState.key
+        bit_map = [0]
+        for _ in range(2):
+            start = len(bit_map)
+            bit_map.extend(start + cell_map[cell]
+                           for cell in range(self.num_cells))
+        for _ in range(2):
+            start = len(bit_map)
+            bit_map.extend(start + leyline_map[leyline]
+                           for leyline in range(self.num_leylines))
+        tables = []
+        for start in range(0, len(bit_map), 8):
+            moved = bit_map[start:start + 8]
+            tables.append([sum(1 << moved[bit] for bit in range(len(moved))
+                               if byte >> bit & 1) for byte in range(256)])
+        return tables
+
+    def map_key(self, key: int, symmetry: int) -> int:
+        """Return the key of the state that symmetry moves the state with
+        key key to.
+        >>> g = get_geometry((2, 3, 2))
+        >>> bin(g.map_key(0b10, 1)), bin(g.map_key(0b100, 1))
+        ('0b10', '0b1000')
+        """
+        mapped = 0
+        for table in self._key_tables[symmetry]:
+            mapped |= table[key & 255]
+            key >>= 8
+        return mapped
+
+    def counts(self, cells: int) -> int:
+        """Return the packed per-leyline counts of the cells in the
+        bitmask cells.
+        >>> g = StonehengeGeometry((2, 3, 2))
+        >>> packed = g.counts(0b0001001)
+        >>> [g.count(packed, leyline) for leyline in range(9)]
+        [1, 1, 0, 1, 1, 0, 0, 2, 0]"""
+        packed = 0
+        while cells:
+            low = cells & -cells
+            packed += self.cell_count_steps[low.bit_length() - 1]
+            cells ^= low
+        return packed
+
+    def count(self, packed: int, leyline: int) -> int:
+        """Return the count of leyline in the packed counts packed."""
+        return (packed >> (self.count_width * leyline)
+                & ((1 << self.count_width) - 1))
+
+    def to_leyline_bits(self, leylines: int) -> int:
+        """Return the leylines in the bitmask leylines as leyline_bits.
+        >>> g = StonehengeGeometry((2, 3, 2))
+        >>> g.to_leyline_bits(0b101) == g.leyline_bits[0] | g.leyline_bits[2]
+        True
+        """
+        bits = 0
+        for table in self._bit_tables:
+            bits |= table[leylines & 255]
+            leylines >>= 8
+        return bits
+
+    def cells_on(self, leylines: int) -> int:
+        """Return the bitmask of the cells on the leylines given as
+        leyline_bits in leylines.
+        >>> g = StonehengeGeometry((2, 3, 2))
+        >>> bin(g.cells_on(g.leyline_bits[0] | g.leyline_bits[3]))
+        '0b111'
+        """
+        cells = 0
+        while leylines:
+            low = leylines & -leylines
+            cells |= self.leyline_masks[low.bit_length() // self.count_width
+                                        - 1]
+            leylines ^= low
+        return cells
+
+    def near_leylines(self, packed: int, owned: int) -> int:
+        """Return, as leyline_bits, the leylines not in owned (also given
+        as leyline_bits) that the player with packed counts packed would
+        capture by claiming one more of their cells. All leylines are
+        tested at once.
+        >>> g = StonehengeGeometry((2, 3, 2))
+        >>> near = g.near_leylines(g.counts(0b0001000), 0)
+        >>> [leyline for leyline in range(9) if near & g.leyline_bits[leyline]]
+        [0, 1, 2, 3, 4, 5, 6, 7, 8]
+        """
+        return (packed + self.near_bias) & self.near_mask & ~owned
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Tuple[int, ...]]]:
+        """Pickle geometries as their row lengths, to be looked up again
+        with get_geometry, rather than as all of their tables.
+        >>> import pickle
+        >>> g = get_geometry((2, 3, 2))
+        >>> pickle.loads(pickle.dumps(g)) is g
+        True
+        """
+        return get_geometry, (self.row_lengths,)
+
+
+_GEOMETRIES = {}
+
+# The labels of the cells of each board, by side length, as Stonehenge
+# labels them, and the mask of the cell with each label.
+_BOARD_LABELS = {}
+
+
+def board_row_lengths(side_length: int) -> Tuple[int, ...]:
+    """Return the row lengths of the board with side length side_length.
+    >>> board_row_lengths(3)
+    (2, 3, 4, 3)"""
+    return tuple(range(2, side_length + 2)) + (side_length,)
+
+
+def board_labels(side_length: int) -> List[Move]:
+    """Return the labels of the cells of the board with side length
+    side_length, row by row: 'A', 'B', ... if there are at most
+    MAX_LETTER_CELLS cells, else the integer cell ids 0, 1, ...
+    >>> board_labels(1)
+    ['A', 'B', 'C']
+    >>> board_labels(6)[:3], len(board_labels(6))
+    ([0, 1, 2], 33)
+    """
+    num_cells = sum(board_row_lengths(side_length))
+    if num_cells <= MAX_LETTER_CELLS:
+        return [chr(65 + cell) for cell in range(num_cells)]
+    return list(range(num_cells))
+
+
+def get_geometry(row_lengths: Tuple[int, ...]) -> StonehengeGeometry:
+    """Return the shared geometry for a board with the given row lengths.
+    >>> get_geometry((2, 3, 2)) is get_geometry((2, 3, 2))
+    True"""
+    if row_lengths not in _GEOMETRIES:
+        _GEOMETRIES[row_lengths] = StonehengeGeometry(row_lengths)
+    return _GEOMETRIES[row_lengths]
+
 
 class StonehengeState(GameState):
-    """Game state for Stonehenge."""
+    """Game state for Stonehenge.
+
+    The board is kept as bitmasks: bit i of p1_cells (p2_cells) is set
+    when player 1 (player 2) has claimed cell i, and bit j of p1_leylines
+    (p2_leylines) is set when that player owns leyline j. p1_counts and
+    p2_counts hold how many cells of each leyline a player has, packed as
+    described in StonehengeGeometry, and p1_points and p2_points how many
+    leylines they own. The nested
+    string lists in state and rows are built from these on demand. The
+    board layout lives in geometry, which is shared by every state on a
+    board of the same size.
+
+    Cells are labelled by strings, or on large boards by integer cell
+    ids, and a move is the label of the cell to claim; _label_masks maps
+    each label to its cells, so moves are found without scanning the
+    board.
+
+    The possible moves, points and whether the game is over are worked
+    out the first time they are asked for and kept until the state
+    changes, so a search asking for them several times per node pays
+    for them once.
+    """
 
     p1_turn: bool
-    state: List[List[str]]
-    rows: List[List[str]]
+    geometry: StonehengeGeometry
+    p1_cells: int
+    p2_cells: int
+    p1_leylines: int
+    p2_leylines: int
+    p1_counts: int
+    p2_counts: int
+    p1_points: int
+    p2_points: int
+    _moves: Optional[List[Move]]
+    _points: Optional[Dict[Union[bool, int], int]]
+    _terminal: Optional[bool]
 
     def __init__(self, is_p1_turn: bool, state: List[List[str]]) -> None:
         """Initializes StonehengeState.
@@ -42,8 +398,118 @@ class StonehengeState(GameState):
 ['@', '@', '@']]
         """
         self.p1_turn = is_p1_turn
-        self.state = state
-        self.rows = [row[1:] for row in self.state[1:-1]]
+        rows = [row[1:] for row in state[1:-1]]
+        self.geometry = get_geometry(tuple(len(row) for row in rows))
+        self._labels = []
+        self._label_masks = {}
+        self.p1_cells = 0
+        self.p2_cells = 0
+        for cell, slot in enumerate(sum(rows, [])):
+            if slot == '1':
+                self.p1_cells |= 1 << cell
+            elif slot == '2':
+                self.p2_cells |= 1 << cell
+            else:
+                self._label_masks[slot] = (self._label_masks.get(slot, 0)
+                                           | 1 << cell)
+            self._labels.append(slot)
+        owners = (state[0] + [row[0] for row in state[1:-1]]
+                  + state[-1])
+        self.p1_leylines = 0
+        self.p2_leylines = 0
+        for leyline, owner in enumerate(owners):
+            if owner == '1':
+                self.p1_leylines |= 1 << leyline
+            elif owner == '2':
+                self.p2_leylines |= 1 << leyline
+        self.p1_counts = self.geometry.counts(self.p1_cells)
+        self.p2_counts = self.geometry.counts(self.p2_cells)
+        self.p1_leylines, self.p2_leylines = self._capture(
+            self.p1_counts, self.p2_counts, self.p1_leylines,
+            self.p2_leylines, range(len(owners)))
+        self.p1_points = _count_bits(self.p1_leylines)
+        self.p2_points = _count_bits(self.p2_leylines)
+        self._forget()
+        # moves made with push, most recent first, as nested pairs
+        self._undo = None
+
+    def _forget(self) -> None:
+        """Forget the moves, points and terminal status worked out for
+        this state, after it has changed."""
+        self._moves = None
+        self._points = None
+        self._terminal = None
+
+    @property
+    def rows(self) -> List[List[str]]:
+        """The rows of the board, without their leylines. Claimed cells
+        appear as '1' or '2'."""
+        slots = []
+        for cell, label in enumerate(self._labels):
+            if self.p1_cells >> cell & 1:
+                slots.append('1')
+            elif self.p2_cells >> cell & 1:
+                slots.append('2')
+            else:
+                slots.append(label)
+        rows = []
+        start = 0
+        for length in self.geometry.row_lengths:
+            rows.append(slots[start:start + length])
+            start += length
+        return rows
+
+    @property
+    def state(self) -> List[List[str]]:
+        """The board in the nested list format accepted by __init__."""
+        owners = self._leyline_strs(self.p1_leylines, self.p2_leylines)
+        num_rows = len(self.geometry.row_lengths)
+        grid = [owners[:num_rows]]
+        for row_num, row in enumerate(self.rows):
+            grid.append([owners[num_rows + row_num]] + row)
+        grid.append(owners[2 * num_rows:])
+        return grid
+
+    def _leyline_strs(self, p1_leylines: int,
+                      p2_leylines: int) -> List[str]:
+        """Return the owner of every leyline as '1', '2' or '@'."""
+        owners = []
+        for leyline in range(len(self.geometry.leyline_masks)):
+            if p1_leylines >> leyline & 1:
+                owners.append('1')
+            elif p2_leylines >> leyline & 1:
+                owners.append('2')
+            else:
+                owners.append('@')
+        return owners
+
+    def _capture(self, p1_counts: int, p2_counts: int, p1_leylines: int,
+                 p2_leylines: int, leylines: Iterable[int]) -> Tuple[int, int]:
+        """Return the leyline masks of both players after giving each
+        unclaimed leyline in leylines to the first player holding at
+        least half of its cells, according to the packed counts."""
+        geometry = self.geometry
+        owned = p1_leylines | p2_leylines
+        for leyline in leylines:
+            bit = 1 << leyline
+            if owned & bit:
+                continue
+            needed = geometry.leyline_needed[leyline]
+            if geometry.count(p1_counts, leyline) >= needed:
+                p1_leylines |= bit
+            elif geometry.count(p2_counts, leyline) >= needed:
+                p2_leylines |= bit
+        return p1_leylines, p2_leylines
+
+    def _leylines_through(self, cells: int) -> List[int]:
+        """Return the leylines passing through any of the cells in the
+        bitmask cells."""
+        leylines = []
+        while cells:
+            low = cells & -cells
+            leylines.extend(self.geometry.cell_leylines[low.bit_length() - 1])
+            cells ^= low
+        return leylines
 
     def get_leylines(self, rows: List[List[str]]) -> List[List[str]]:
         """Using a new rows list, and self.state, create
@@ -60,70 +526,29 @@ class StonehengeState(GameState):
         >>> e = StonehengeState(True, r)
         >>> e.get_leylines(y)
         [['1', '@', '@'], ['1', '@', '@'], ['@', '@', '@']]"""
+        p1_cells = 0
+        p2_cells = 0
+        for cell, slot in enumerate(sum(rows, [])):
+            if slot == '1':
+                p1_cells |= 1 << cell
+            elif slot == '2':
+                p2_cells |= 1 << cell
+        changed = ((p1_cells ^ self.p1_cells) | (p2_cells ^ self.p2_cells))
+        owners = self._leyline_strs(*self._capture(
+            self.geometry.counts(p1_cells), self.geometry.counts(p2_cells),
+            self.p1_leylines, self.p2_leylines,
+            self._leylines_through(changed)))
+        num_rows = len(self.geometry.row_lengths)
+        return [owners[:num_rows], owners[num_rows:2 * num_rows],
+                owners[2 * num_rows:]]
 
-        leylines = []
-        top_right_paral = self.make_parallelogram(rows, True)
-        len_line = len(top_right_paral[0])
-        top_leylines = []
-        for i in range(len_line):
-            single_line = []
-            # this gets the line
-            for line in top_right_paral:
-                if line[i] != '.':
-                    single_line.append(line[i])
-            # this gets the leyline
-            if ((self.state[0][i] == '@' and
-                 single_line.count('1') >= len(single_line)/2)
-                    or self.state[0][i] == '1'):
-                top_leylines.append('1')
-            elif ((self.state[0][i] == '@' and
-                   single_line.count('2') >= len(single_line)/2)
-                  or self.state[0][i] == '2'):
-                top_leylines.append('2')
-            else:
-                top_leylines.append('@')
-        middle_leylines = []
-        for i in range(len_line):
-            if ((self.state[i+1][0] == '@' and
-                 rows[i].count('1') >= len(rows[i])/2)
-                    or self.state[i+1][0] == '1'):
-                middle_leylines.append('1')
-            elif ((self.state[i+1][0] == '@' and
-                   rows[i].count('2') >= len(rows[i])/2)
-                  or self.state[i + 1][0] == '2'):
-                middle_leylines.append('2')
-            else:
-                middle_leylines.append('@')
-        top_left_paral = self.make_parallelogram(rows, False)
-        bottom_leylines = []
-        for i in range(len_line):
-            single_line = []
-            for line in top_left_paral:
-                if line[i] != '.':
-                    single_line.append(line[i])
-            if ((self.state[-1][i] == '@' and
-                 single_line.count('1') >= len(single_line)/2)
-                    or self.state[-1][i] == '1'):
-                bottom_leylines.append('1')
-            elif ((self.state[-1][i] == '@' and
-                   single_line.count('2') >= len(single_line)/2)
-                  or self.state[-1][i] == '2'):
-                bottom_leylines.append('2')
-            else:
-                bottom_leylines.append('@')
-        leylines.append(top_leylines)
-        leylines.append(middle_leylines)
-        leylines.append(bottom_leylines)
-        return leylines
-
-    def _list_for_str(self) -> List[List[str]]:
-        """Returns a nested list that is more friendly
-        for creating the string method
+    def _list_for_str(self, grid: List[List[str]]) -> List[List[str]]:
+        """Returns a nested list made from grid, a board in the format of
+        state, that is more friendly for creating the string method
         """
 
-        num_leyline_2_diff = len(self.state[0]) - len(self.rows[0])
-        # first make shallow copy of self.state
-        new_list = [x[:] for x in self.state]
+        new_list = [row[:] for row in grid]
+        num_leyline_2_diff = len(new_list[0]) - len(new_list[1][1:])
         for line_num in range(num_leyline_2_diff):
             l = new_list[0][2]
             new_list[1+line_num].append(l)
@@ -146,13 +571,14 @@ class StonehengeState(GameState):
         # [['/', '\\', '/', '\\', '/'], ['\\', '/', '\\', '/', '\\']]"""
 
         all_dashes = []
-        for row_num in range(len(self.rows)-2):
+        row_lengths = self.geometry.row_lengths
+        for row_num in range(len(row_lengths)-2):
             # slots of row is = 2+ row_num
             slots_of_row = 2 + row_num
             dashes = ['/', '\\']
             dash_row = dashes*slots_of_row + ['/']
             all_dashes.append(dash_row)
-        last_dash_row = ['\\', '/']*(len(self.rows[-1])) + ['\\']
+        last_dash_row = ['\\', '/']*(row_lengths[-1]) + ['\\']
         all_dashes.append(last_dash_row)
         # top and bottom leyline dashes omitted
         # since they follow a diff space pattern
@@ -178,14 +604,23 @@ class StonehengeState(GameState):
                 @   @
         """
 
+        grid = self.state
+        width = max(len(str(slot)) for row in grid for slot in row)
+        if width == 1:
+            return self._draw(grid)
+        return self._draw_wide(grid, width)
+
+    def _draw(self, grid: List[List[str]]) -> str:
+        """Returns the picture of grid, a board in the format of state
+        whose slots are all one character, that __str__ prints."""
         return_string = ""
-        str_list = self._list_for_str()
+        str_list = self._list_for_str(grid)
         dashes = self.slash_list()
         # length of longest row.
         total_length = len(str_list[-2]) * 4 #char + ' -
         # white space of first row + 6, since 6 will put it 2 after first letter
         # This puts dash at 1 after letter, and 1 before leyline
-        leyline_white = (total_length - len(self.state[1]) * 4) // 2 + 6
+        leyline_white = (total_length - len(grid[1]) * 4) // 2 + 6
         top_right_dash_white = leyline_white - 1
         # same here, but with white space of last row
 
@@ -200,7 +635,7 @@ class StonehengeState(GameState):
             row = str_list[num][:-1]
             # each character in row is followed by 3 characters, so total
             # space taken by row characters is 4*len(row)
-            left_white = (total_length - len(self.state[num]) * 4) // 2
+            left_white = (total_length - len(grid[num]) * 4) // 2
             return_string += left_white * ' '
             return_string += ' - '.join(row)
             if num != len(str_list) - 3:
@@ -219,7 +654,7 @@ class StonehengeState(GameState):
             return_string += ' '.join(dashes[num - 1])
             return_string += '\n'
         # final row
-        left_white = (total_length - len(self.state[-2]) * 4) // 2
+        left_white = (total_length - len(grid[-2]) * 4) // 2
         return_string += left_white * ' '
         return_string += ' - '.join(str_list[-2][:-1])
         return_string += '   '
@@ -237,6 +672,56 @@ class StonehengeState(GameState):
         return_string += '   '.join(str_list[-1])
         return return_string
 
+    def _draw_wide(self, grid: List[List[Move]], width: int) -> str:
+        """Returns the picture of grid, a board in the format of state,
+        with every slot written centred in width characters, for boards
+        labelled with cell ids. Claimed cells and leylines are written [1]
+        and [2], so they are not mistaken for cells 1 and 2. The board is
+        drawn by _draw with one character stand-ins for the slots, then
+        spread out to fit them.
+        >>> r = [['@', '@', '@'], \
+                ['@', 10, 11], \
+                ['@', 12, '1', 14], \
+                ['@', 15, 16], \
+                ['@', '@', '@']]
+        >>> print(StonehengeState(True, r))
+                        @       @
+                      /       /
+            @   -   10  -   11      @
+                  /   \\   /   \\   /
+        @   -   12  -  [1]  -   14
+                  \\   /   \\   /   \\
+            @   -   15  -   16      @
+                      \\       \\
+                        @       @
+        """
+        # odd, so that slots can be centred between their neighbours, and
+        # wide enough for [1]
+        width = max(3, width + 1 - width % 2)
+        # slots _draw puts 4 columns apart are put 4 * scale apart
+        scale = (width + 6) // 4
+        slots = {}
+        stand_ins = []
+        for row in grid:
+            stand_in_row = []
+            for slot in row:
+                stand_in = chr(0xE000 + len(slots))
+                if slot in ('1', '2'):
+                    slot = '[{}]'.format(slot)
+                slots[stand_in] = str(slot).center(width)
+                stand_in_row.append(stand_in)
+            stand_ins.append(stand_in_row)
+        lines = []
+        for line in self._draw(stand_ins).split('\n'):
+            chars = [' '] * (len(line) * scale + width)
+            for column, char in enumerate(line):
+                if char in slots:
+                    chars[column * scale:column * scale + width] = slots[char]
+                elif char != ' ':
+                    chars[column * scale + width // 2] = char
+            lines.append(''.join(chars).rstrip())
+        return textwrap.dedent('\n'.join(lines))
+
     def __repr__(self):
         """return an easy to read format of self.
         >>> st = [['@', '@', '@'], \
@@ -266,7 +751,9 @@ class StonehengeState(GameState):
         return x
 
     def get_possible_moves(self) -> list:
-        """returns the available moves in a list.
+        """returns the available moves in a list, in board order. Only
+        the unclaimed cells are visited. The list is kept on the state and
+        returned again by later calls, so it must not be changed.
         >>> st = [['@', '@', '@'], \
                 ['@', 'A', 'B'], \
                 ['@', 'C', 'D', 'E'], \
@@ -276,11 +763,21 @@ class StonehengeState(GameState):
         >>> ex.get_possible_moves()
         ['A', 'B', 'C', 'D', 'E', 'F', 'D']
         """
-        x = self.get_points()
-        if x[True] >= x[2]/2 or x[False] >= x[2]/2:
-            return []
-        slots = sum(self.rows, [])
-        moves = [x for x in slots if x != '1' and x != '2']
+        moves = self._moves
+        if moves is not None:
+            return moves
+        # the list is only kept once it is complete, since other threads
+        # may be reading the same state
+        moves = []
+        win = self.geometry.points_to_win
+        if self.p1_points < win and self.p2_points < win:
+            free = self.geometry.full_mask & ~(self.p1_cells | self.p2_cells)
+            labels = self._labels
+            while free:
+                low = free & -free
+                moves.append(labels[low.bit_length() - 1])
+                free ^= low
+        self._moves = moves
         return moves
 
     def make_parallelogram(self, new_rows: List[List[str]],
@@ -317,7 +814,7 @@ class StonehengeState(GameState):
                     row.append('.')
         return parellelogram
 
-    def make_move(self, move: str) -> 'StonehengeState':
+    def make_move(self, move: Move) -> 'StonehengeState':
         """Makes a move which creates and returns a new instance
         of StonehengeState. This state remains unchanged.
         >>> r = [['@', '@', '@'], \
@@ -350,23 +847,81 @@ class StonehengeState(GameState):
                 @   @
         p2 to move.
         """
-        # get new rows
-        new_row = [x[:] for x in self.rows]
-        for row in new_row:
-            for i in range(len(row)):
-                if row[i] == move and self.p1_turn:
-                    row[i] = '1'
-                elif row[i] == move:
-                    row[i] = '2'
-        # get new leyline list
-        new_leylines = self.get_leylines(new_row)
-        for i in range(len(new_row)):
-            new_row[i].insert(0, new_leylines[1][i])
-        new_row.insert(0, new_leylines[0])
-        new_row.append(new_leylines[2])
+        child = StonehengeState.__new__(type(self))
+        child.__dict__.update(self.__dict__)
+        child._undo = None
+        child._claim(self._free_cells(move))
+        return child
+
+    def _claim(self, cells: int) -> None:
+        """Give the cells in the bitmask cells, and any leylines they
+        complete, to the current player, and pass the turn."""
+        geometry = self.geometry
+        self._forget()
         if self.p1_turn:
-            return StonehengeState(False, new_row)
-        return StonehengeState(True, new_row)
+            self.p1_cells |= cells
+        else:
+            self.p2_cells |= cells
+        leylines = []
+        while cells:
+            low = cells & -cells
+            cell = low.bit_length() - 1
+            if self.p1_turn:
+                self.p1_counts += geometry.cell_count_steps[cell]
+            else:
+                self.p2_counts += geometry.cell_count_steps[cell]
+            leylines.extend(geometry.cell_leylines[cell])
+            cells ^= low
+        # only the player who moved can have reached a new leyline
+        owned = self.p1_leylines | self.p2_leylines
+        for leyline in leylines:
+            bit = 1 << leyline
+            if owned & bit:
+                continue
+            needed = geometry.leyline_needed[leyline]
+            if self.p1_turn:
+                if geometry.count(self.p1_counts, leyline) >= needed:
+                    self.p1_leylines |= bit
+                    self.p1_points += 1
+                    owned |= bit
+            elif geometry.count(self.p2_counts, leyline) >= needed:
+                self.p2_leylines |= bit
+                self.p2_points += 1
+                owned |= bit
+        self.p1_turn = not self.p1_turn
+
+    def push(self, move: Move) -> None:
+        """Make move on this state itself, instead of on a new state.
+        It can be taken back with pop.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r)
+        >>> e.push('A')
+        >>> e.push('D')
+        >>> e == StonehengeState(True, r).make_move('A').make_move('D')
+        True
+        >>> e.pop()
+        >>> e.pop()
+        >>> e == StonehengeState(True, r)
+        True
+        """
+        self._undo = ((self.p1_turn, self.p1_cells, self.p2_cells,
+                       self.p1_leylines, self.p2_leylines, self.p1_counts,
+                       self.p2_counts, self.p1_points, self.p2_points,
+                       self._moves, self._points, self._terminal),
+                      self._undo)
+        self._claim(self._free_cells(move))
+
+    def pop(self) -> None:
+        """Take back the last move made with push, along with what was
+        worked out for the state before it."""
+        saved, self._undo = self._undo
+        (self.p1_turn, self.p1_cells, self.p2_cells, self.p1_leylines,
+         self.p2_leylines, self.p1_counts, self.p2_counts, self.p1_points,
+         self.p2_points, self._moves, self._points, self._terminal) = saved
 
     def get_points(self) -> Dict[Union[bool, int], int]:
         """returns number of leylines captured by each player
@@ -374,6 +929,7 @@ class StonehengeState(GameState):
         The list returned is formatted as such:
         [p1 captured leylines, p2 captured leylines,
         total leylines in game]
+        Like the moves, it is kept on the state and must not be changed.
         >>> r = [['@', '@', '@'], \
                 ['@', 'A', 'B'], \
                 ['@', 'C', 'D', 'E'], \
@@ -382,18 +938,153 @@ class StonehengeState(GameState):
         >>> e = StonehengeState(True, r)
         >>> print(e.get_points())
         {True: 1, False: 0, 2: 9}"""
-        p1_leylines = 0
-        p2_leylines = 0
-        leylines = self.get_leylines(self.rows)
-        for ll_type in leylines:
-            for point in ll_type:
-                if point == '1':
-                    p1_leylines += 1
-                elif point == '2':
-                    p2_leylines += 1
-        total_points = {True: p1_leylines, False: p2_leylines,
-                        2: len(leylines[0])*3}
-        return total_points
+        points = self._points
+        if points is None:
+            points = self._points = {True: self.p1_points,
+                                     False: self.p2_points,
+                                     2: self.geometry.num_leylines}
+        return points
+
+    def is_terminal(self) -> bool:
+        """Return whether the game is over in this state, either because
+        a player owns enough leylines or because every cell is claimed.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r)
+        >>> e.is_terminal()
+        False
+        >>> x = e.make_move('A').make_move('C').make_move('B')
+        >>> x.make_move('D').make_move('G').is_terminal()
+        True
+        """
+        terminal = self._terminal
+        if terminal is None:
+            win = self.geometry.points_to_win
+            terminal = self._terminal = (
+                self.p1_points >= win or self.p2_points >= win
+                or self.p1_cells | self.p2_cells == self.geometry.full_mask)
+        return terminal
+
+    def capture_count(self, move: Move) -> int:
+        """Return how many leylines the current player would capture by
+        making move.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r)
+        >>> e.capture_count('A'), e.capture_count('D')
+        (2, 0)
+        """
+        geometry = self.geometry
+        counts = self.p1_counts if self.p1_turn else self.p2_counts
+        owned = self.p1_leylines | self.p2_leylines
+        captures = 0
+        for leyline in self._leylines_through(self._free_cells(move)):
+            if (not owned >> leyline & 1 and geometry.count(counts, leyline)
+                    + 1 >= geometry.leyline_needed[leyline]):
+                captures += 1
+        return captures
+
+    def contested_count(self, move: Move) -> int:
+        """Return how many of the unclaimed leylines through move already
+        have a claimed cell on them.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r).make_move('C')
+        >>> e.contested_count('D'), e.contested_count('B')
+        (1, 0)
+        """
+        geometry = self.geometry
+        claimed = self.p1_cells | self.p2_cells
+        owned = self.p1_leylines | self.p2_leylines
+        contested = 0
+        for leyline in self._leylines_through(self._free_cells(move)):
+            if (not owned >> leyline & 1
+                    and claimed & geometry.leyline_masks[leyline]):
+                contested += 1
+        return contested
+
+    def cell_label(self, cell: int) -> Move:
+        """Return the move that claims cell, counting cells row by row
+        from 0.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> StonehengeState(True, r).cell_label(3)
+        'D'
+        """
+        return self._labels[cell]
+
+    def _free_cells(self, move: Move) -> int:
+        """Return the bitmask of unclaimed cells labelled move."""
+        return self._label_masks.get(move, 0) & ~(self.p1_cells
+                                                  | self.p2_cells)
+
+    def _winning_cells(self, cells: int, near: int, needed: int) -> int:
+        """Return the bitmask of the cells in the bitmask cells that
+        capture at least needed leylines for the player whose near
+        leylines, as returned by StonehengeGeometry.near_leylines, are
+        near."""
+        geometry = self.geometry
+        # every cell is on 3 leylines
+        if not near or needed > 3:
+            return 0
+        cells &= geometry.cells_on(near)
+        if needed == 1:
+            return cells
+        leyline_bits = geometry.cell_leyline_bits
+        winning = 0
+        while cells:
+            low = cells & -cells
+            if _count_bits(leyline_bits[low.bit_length() - 1]
+                           & near) >= needed:
+                winning |= low
+            cells ^= low
+        return winning
+
+    def _tactics(self) -> Tuple[int, int, int]:
+        """Return the result of rough_outcome, and the near leylines of
+        the player to move and of the other player."""
+        geometry = self.geometry
+        win = geometry.points_to_win
+        if self.p1_turn:
+            mine, theirs = self.p1_counts, self.p2_counts
+            my_points, their_points = self.p1_points, self.p2_points
+        else:
+            mine, theirs = self.p2_counts, self.p1_counts
+            my_points, their_points = self.p2_points, self.p1_points
+        owned = geometry.to_leyline_bits(self.p1_leylines | self.p2_leylines)
+        my_near = geometry.near_leylines(mine, owned)
+        their_near = geometry.near_leylines(theirs, owned)
+        if my_points >= win or their_points >= win:
+            return (1 if my_points >= win else -1), my_near, their_near
+        free = geometry.full_mask & ~(self.p1_cells | self.p2_cells)
+        if not free:
+            return 0, my_near, their_near
+        if self._winning_cells(free, my_near, win - my_points):
+            return 1, my_near, their_near
+        threats = self._winning_cells(free, their_near, win - their_points)
+        # look for a move that takes every threatened cell, or captures
+        # the leylines the threats need; no other move can stop them
+        cells = free & (threats | geometry.cells_on(my_near & their_near))
+        while threats and cells:
+            low = cells & -cells
+            taken = geometry.cell_leyline_bits[low.bit_length() - 1] & my_near
+            if not self._winning_cells(threats & ~low, their_near & ~taken,
+                                       win - their_points):
+                return 0, my_near, their_near
+            cells ^= low
+        return (-1 if threats else 0), my_near, their_near
 
     def rough_outcome(self) -> float:
         """Returns a rough estimate of the game outcome.
@@ -401,6 +1092,9 @@ class StonehengeState(GameState):
         return 1. If for all moves moves the current player makes,
         the other player still has a move that can make them win,
         return -1. Otherwise, return 0.
+
+        Winning cells and blocks are found from the per-leyline counts,
+        without making any moves.
         >>> r = [['1', '@', '@'], \
                 ['1', '1', 'B'], \
                 ['@', 'C', 'D', 'E'], \
@@ -408,37 +1102,209 @@ class StonehengeState(GameState):
                 ['@', '@', '@']]
         >>> e = StonehengeState(True, r)
         >>> e.rough_outcome()
-        1"""
-        for move in self.get_possible_moves():
-            new_state = self.make_move(move)
-            points = new_state.get_points()
-            # check to see if current player wins with that move
-            if points[self.p1_turn] > points[2]/2:
-                return 1
-
-        for move in self.get_possible_moves():
-            # then check to see if other player cannot win
-            new_state = self.make_move(move)
-            points = new_state.get_points()
-            other_player_moves = new_state.get_possible_moves()
-            can_win = []
-            for w in other_player_moves:
-                possible_state = new_state.make_move(w)
-                possible_points = possible_state.get_points()
-                # if this move cannot win, add False
-                if possible_points[not self.p1_turn] < points[2]/2:
-                    can_win.append(False)
-            # there does not exist a move the other player can make
-            # that wins the game
-            if not any(can_win):
-                return 0
-        # for each move the current player makes, it cannot win them the game,
-        # and the other player has a move that makes them win.
-        return -1
+        1
+        >>> e.make_move('C').rough_outcome()
+        -1
+        >>> StonehengeState(False, r).rough_outcome()
+        0
+        """
+        return self._tactics()[0]
+
+    def winning_moves(self, p1: Optional[bool] = None) -> List[Move]:
+        """Return the moves that would win the game at once for player 1
+        if p1 is True, player 2 if it is False, or the player to move if
+        it is None, were it their turn.
+        >>> r = [['1', '@', '@'], \
+                ['1', '1', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> StonehengeState(True, r).make_move('C').winning_moves(True)
+        ['D', 'E', 'G']
+        """
+        if p1 is None:
+            p1 = self.p1_turn
+        geometry = self.geometry
+        win = geometry.points_to_win
+        points = self.p1_points if p1 else self.p2_points
+        if self.p1_points >= win or self.p2_points >= win:
+            return []
+        cells = self._winning_cells(
+            geometry.full_mask & ~(self.p1_cells | self.p2_cells),
+            geometry.near_leylines(
+                self.p1_counts if p1 else self.p2_counts,
+                geometry.to_leyline_bits(self.p1_leylines | self.p2_leylines)),
+            win - points)
+        moves = []
+        while cells:
+            low = cells & -cells
+            moves.append(self._labels[low.bit_length() - 1])
+            cells ^= low
+        return moves
+
+    def evaluate(self) -> float:
+        """Return a score for this state for the player to move, from -1
+        to 1, for searches that stop before the end of the game. It is
+        rough_outcome when that is 1 or -1, and otherwise the difference
+        in captured leylines, and in leylines one cell away from being
+        captured (counted NEAR_WEIGHT as much), as a fraction of what it
+        could be.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> StonehengeState(True, r).make_move('A').evaluate()
+        -0.18518518518518517
+        """
+        outcome, my_near, their_near = self._tactics()
+        if outcome or self.is_terminal():
+            return outcome
+        margin = self.p1_points - self.p2_points
+        if not self.p1_turn:
+            margin = -margin
+        margin += NEAR_WEIGHT * (_count_bits(my_near)
+                                 - _count_bits(their_near))
+        return margin / ((1 + NEAR_WEIGHT) * self.geometry.num_leylines)
+
+    def key(self) -> int:
+        """Return a compact key for this state: the cell masks, leyline
+        masks and player to move packed into one int. States on the same
+        board have the same key iff they are equal.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r)
+        >>> e.key()
+        1
+        >>> bin(e.make_move('A').key())
+        '0b1001000000000000010'
+        """
+        num_cells = self.geometry.num_cells
+        num_leylines = self.geometry.num_leylines
+        key = self.p2_leylines
+        key = key << num_leylines | self.p1_leylines
+        key = key << num_cells | self.p2_cells
+        key = key << num_cells | self.p1_cells
+        return key << 1 | self.p1_turn
+
+    def canonical(self) -> Tuple[int, int]:
+        """Return the smallest key of the states that the board's
+        symmetries move this state to, and the symmetry giving it.
+        Symmetric states have the same canonical key and the same value,
+        so memo tables can keep one entry for all of them.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r)
+        >>> e.make_move('A').canonical()[0] == e.make_move('G').canonical()[0]
+        True
+        >>> e.make_move('A').canonical()[0] == e.make_move('D').canonical()[0]
+        False
+        """
+        geometry = self.geometry
+        key = self.key()
+        best_key = key
+        best_symmetry = 0
+        for symmetry in range(1, len(geometry.cell_maps)):
+            mapped = geometry.map_key(key, symmetry)
+            if mapped < best_key:
+                best_key = mapped
+                best_symmetry = symmetry
+        return best_key, best_symmetry
+
+    def to_canonical_move(self, move: Move, symmetry: int) -> Move:
+        """Return the move in the canonical state that matches move in
+        this state, where symmetry is the one returned by canonical.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r).make_move('G')
+        >>> _, symmetry = e.canonical()
+        >>> e.from_canonical_move(e.to_canonical_move('B', symmetry), \
+symmetry)
+        'B'
+        """
+        cells = self._label_masks[move]
+        cell = (cells & -cells).bit_length() - 1
+        return self._labels[self.geometry.cell_maps[symmetry][cell]]
+
+    def from_canonical_move(self, move: Move, symmetry: int) -> Move:
+        """Return the move in this state that matches move in the
+        canonical state; the reverse of to_canonical_move."""
+        cells = self._label_masks[move]
+        cell = (cells & -cells).bit_length() - 1
+        return self._labels[self.geometry.inverse_cell_maps[symmetry][cell]]
+
+    def __hash__(self) -> int:
+        """Return a hash of this state, consistent with __eq__."""
+        return hash(self.key())
+
+    def to_bytes(self) -> bytes:
+        """Return this state packed into bytes: one byte for the side
+        length of the board, then key() in as few bytes as it fits in,
+        which is 1 bit for the player to move and 2 bits for each cell and
+        each leyline. Only boards of the shape Stonehenge builds can be
+        packed, and from_bytes labels cells as Stonehenge does.
+        >>> r = [['@', '@', '@'], \
+                ['@', 'A', 'B'], \
+                ['@', 'C', 'D', 'E'], \
+                ['@', 'F', 'G'], \
+                ['@', '@', '@']]
+        >>> e = StonehengeState(True, r).make_move('A').make_move('D')
+        >>> e.to_bytes()
+        b'\\x02\\x03\\x88\\x04\\x00\\x00'
+        >>> StonehengeState.from_bytes(e.to_bytes()) == e
+        True
+        """
+        geometry = self.geometry
+        side_length = len(geometry.row_lengths) - 1
+        if geometry.row_lengths != board_row_lengths(side_length):
+            raise ValueError('only Stonehenge boards can be packed')
+        size = (2 * (geometry.num_cells + geometry.num_leylines) + 8) // 8
+        return bytes((side_length,)) + self.key().to_bytes(size, 'little')
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'StonehengeState':
+        """Return the state packed into data by to_bytes."""
+        side_length = data[0]
+        geometry = get_geometry(board_row_lengths(side_length))
+        if side_length not in _BOARD_LABELS:
+            labels = board_labels(side_length)
+            _BOARD_LABELS[side_length] = (labels, {
+                label: 1 << cell for cell, label in enumerate(labels)})
+        key = int.from_bytes(data[1:], 'little')
+        cell_mask = geometry.full_mask
+        leyline_mask = (1 << geometry.num_leylines) - 1
+        state = StonehengeState.__new__(StonehengeState)
+        state.p1_turn = bool(key & 1)
+        key >>= 1
+        state.p1_cells = key & cell_mask
+        key >>= geometry.num_cells
+        state.p2_cells = key & cell_mask
+        key >>= geometry.num_cells
+        state.p1_leylines = key & leyline_mask
+        state.p2_leylines = key >> geometry.num_leylines
+        state.geometry = geometry
+        state._labels, state._label_masks = _BOARD_LABELS[side_length]
+        state.p1_counts = geometry.counts(state.p1_cells)
+        state.p2_counts = geometry.counts(state.p2_cells)
+        state.p1_points = _count_bits(state.p1_leylines)
+        state.p2_points = _count_bits(state.p2_leylines)
+        state._forget()
+        state._undo = None
+        return state
 
     def __eq__(self, obj: Any) -> bool:
         """ compares if another object obj is the same as self"""
-        return type(obj) == type(self) and obj.__repr__() == self.__repr__()
+        return (type(obj) == type(self) and obj.geometry is self.geometry
+                and obj.key() == self.key())
 
 if __name__ == '__main__':
     from python_ta import check_all
@@ -1,9 +1,19 @@
 """
 A module for strategies.
 """
-from typing import Any, Union, List, Dict
+from typing import Any, Union, List, Dict, Callable, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import atexit
 import copy
+import cProfile
+import functools
+import os
+import pstats
+import time
+import tracemalloc
 from simple_tree import Tree
+from transposition_table import (TranspositionTable, TableEntry, EXACT,
+                                 LOWER_BOUND, UPPER_BOUND, FULL_DEPTH)
 from subtract_square_game import SubtractSquareGame
 from stonehenge_game import Stonehenge
 
@@ -16,138 +26,755 @@ def interactive_strategy(game: Any) -> Any:
     return game.str_to_move(move)
 
 
-def recursive_minimax(game: Union[Stonehenge, SubtractSquareGame]) -> Any:
+def state_key(state: Any) -> Any:
+    """Return a compact hashable key for state, for use in memo tables.
+    States with symmetries (canonical()) are keyed by their canonical key,
+    so symmetric states share one entry. Other states use key(), or fall
+    back to their __repr__."""
+    return table_key(state)[0]
+
+
+def table_key(state: Any) -> Tuple[Any, Optional[int]]:
+    """Return the memo table key of state, and the symmetry that takes
+    state to the state the key belongs to (None if state has no
+    symmetries). Moves kept in the table are in terms of that state; see
+    to_table_move and from_table_move."""
+    if hasattr(state, 'canonical'):
+        return state.canonical()
+    if hasattr(state, 'key'):
+        return state.key(), None
+    return state.__repr__(), None
+
+
+def to_table_move(state: Any, move: Any, symmetry: Optional[int]) -> Any:
+    """Return move in state as it is kept in the memo table."""
+    if symmetry is None or move is None:
+        return move
+    return state.to_canonical_move(move, symmetry)
+
+
+def from_table_move(state: Any, move: Any, symmetry: Optional[int]) -> Any:
+    """Return the move in state matching move kept in the memo table."""
+    if symmetry is None or move is None:
+        return move
+    return state.from_canonical_move(move, symmetry)
+
+
+def uses_table(strategy: Callable) -> Callable:
+    """Mark strategy as taking a table keyword argument: a
+    TranspositionTable that GameInterface keeps for the whole game."""
+    strategy.uses_table = True
+    return strategy
+
+
+def collects_stats(strategy: Callable) -> Callable:
+    """Mark strategy as taking a stats keyword argument: a SearchStats
+    that it fills in while it searches."""
+    strategy.collects_stats = True
+    return strategy
+
+
+class SearchStats:
+    """Counts and timings of the searches of strategies given this object.
+
+    nodes counts the positions whose moves were searched and terminals
+    the finished positions reached. memo_hits and memo_misses count the
+    lookups of positions in the memo table, and cutoffs the times the
+    rest of a position's moves were skipped. max_depth is the most moves
+    ahead of the current state reached. move_time is the seconds spent
+    making moves, and evaluation_time the seconds spent checking whether
+    positions are finished and scoring them.
+    >>> stats = SearchStats()
+    >>> recursive_minimax(Stonehenge(True, 2), stats=stats)
+    'A'
+    >>> stats.nodes, stats.terminals, stats.memo_hits, stats.max_depth
+    (30, 14, 12, 7)
+    """
+    nodes: int
+    terminals: int
+    memo_hits: int
+    memo_misses: int
+    cutoffs: int
+    max_depth: int
+    move_time: float
+    evaluation_time: float
+
+    def __init__(self) -> None:
+        """Initializes stats with nothing counted."""
+        self.nodes = 0
+        self.terminals = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.cutoffs = 0
+        self.max_depth = 0
+        self.move_time = 0.0
+        self.evaluation_time = 0.0
+
+    def reached(self, depth: int) -> None:
+        """Record that the search reached depth moves ahead."""
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def merge(self, other: 'SearchStats') -> None:
+        """Add the counts and timings of other to these."""
+        self.nodes += other.nodes
+        self.terminals += other.terminals
+        self.memo_hits += other.memo_hits
+        self.memo_misses += other.memo_misses
+        self.cutoffs += other.cutoffs
+        self.reached(other.max_depth)
+        self.move_time += other.move_time
+        self.evaluation_time += other.evaluation_time
+
+    def __str__(self) -> str:
+        """Return the stats on one line."""
+        return ('{} nodes, {} terminal, memo {} hits {} misses, {} cutoffs, '
+                'depth {}, make_move {:.3f}s, evaluation {:.3f}s'.format(
+                    self.nodes, self.terminals, self.memo_hits,
+                    self.memo_misses, self.cutoffs, self.max_depth,
+                    self.move_time, self.evaluation_time))
+
+
+def _make_move(state: Any, move: Any, stats: Optional[SearchStats]) -> Any:
+    """Return state.make_move(move), timed in stats if it is given."""
+    if stats is None:
+        return state.make_move(move)
+    start = time.perf_counter()
+    new_state = state.make_move(move)
+    stats.move_time += time.perf_counter() - start
+    return new_state
+
+
+def _push(state: Any, move: Any, stats: Optional[SearchStats]) -> None:
+    """state.push(move), timed in stats if it is given."""
+    if stats is None:
+        state.push(move)
+        return
+    start = time.perf_counter()
+    state.push(move)
+    stats.move_time += time.perf_counter() - start
+
+
+def _is_over(game: Any, state: Any, stats: Optional[SearchStats]) -> bool:
+    """Return game.is_over(state), timed in stats if it is given."""
+    if stats is None:
+        return game.is_over(state)
+    start = time.perf_counter()
+    over = game.is_over(state)
+    stats.evaluation_time += time.perf_counter() - start
+    return over
+
+
+def _terminal_value(game: Any, state: Any,
+                    stats: Optional[SearchStats]) -> int:
+    """Return terminal_value(game, state), counted and timed in stats if
+    it is given."""
+    if stats is None:
+        return terminal_value(game, state)
+    start = time.perf_counter()
+    value = terminal_value(game, state)
+    stats.evaluation_time += time.perf_counter() - start
+    stats.terminals += 1
+    return value
+
+
+def profiled(strategy: Callable, tool: str = 'cprofile',
+             limit: int = 15) -> Callable:
+    """Return strategy, but with each call run under cProfile (tool
+    'cprofile') or tracemalloc (tool 'tracemalloc'), printing the limit
+    functions that took the most time, or the limit lines that allocated
+    the most memory, after each move.
+    """
+    @functools.wraps(strategy)
+    def profiled_strategy(*args: Any, **kwargs: Any) -> Any:
+        """strategy, profiled."""
+        if tool == 'tracemalloc':
+            tracemalloc.start()
+            try:
+                move = strategy(*args, **kwargs)
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+            for line in snapshot.statistics('lineno')[:limit]:
+                print(line)
+            return move
+        profile = cProfile.Profile()
+        move = profile.runcall(strategy, *args, **kwargs)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(limit)
+        return move
+    return profiled_strategy
+
+
+def terminal_value(game: Any, state: Any) -> int:
+    """Return the score of the finished state state of game for the
+    player to move in it: 1 for a win, -1 for a loss and 0 for a tie."""
+    finished = copy.copy(game)
+    finished.current_state = state
+    player = state.get_current_player_name()
+    if finished.is_winner(player):
+        return 1
+    if finished.is_winner('p2' if player == 'p1' else 'p1'):
+        return -1
+    return 0
+
+
+@uses_table
+@collects_stats
+def recursive_minimax(game: Union[Stonehenge, SubtractSquareGame],
+                      table: Optional[TranspositionTable] = None,
+                      stats: Optional[SearchStats] = None) -> Any:
     """A recursive implementation of minimax.
+    If table is given, scores are looked up in and saved to it, so they
+    can be reused on later moves. If stats is given, the search is
+    counted in it.
     """
     scores = []
     moves = game.current_state.get_possible_moves()
-    seen_states = {}
+    seen_states = table if table is not None else {}
+    if stats is not None:
+        stats.nodes += 1
     for move in moves:
-        if get_score(game, move, seen_states) == 1:
+        score = get_score(game, move, seen_states, stats)
+        if score == 1:
+            if stats is not None:
+                stats.cutoffs += 1
             return move
-        else:
-            scores.append(get_score(game, move, seen_states))
+        scores.append(score)
     highest_score = max(scores)
     index_of_score = scores.index(highest_score)
-    move = game.current_state.get_possible_moves()[index_of_score]
+    move = moves[index_of_score]
     return move
 
 
 def get_score(game: Union[Stonehenge,
                           SubtractSquareGame], move: Any,
-              seen_states: Dict['GameState', int]) -> int:
+              seen_states: Union[Dict[Any, int], TranspositionTable],
+              stats: Optional[SearchStats] = None, depth: int = 1) -> int:
     """Returns a score for move in the current state of game.
     move is assumed to be a valid move.
     Will return 1 if move guarantees at most a win.
     Will return 0 if move guarantees at most a tie.
-    Will return -1 if move guarantees at most a loss."""
+    Will return -1 if move guarantees at most a loss.
+    seen_states maps state keys to the score of that state for the
+    player to move in it. The state after move is depth moves ahead of
+    the state the search started from."""
 
-    # get old and new states
-    new_state = game.current_state.make_move(move)
-    old_state = game.current_state
-
-    # get old and new player
-    old_player = old_state.get_current_player_name()
-    new_player = new_state.get_current_player_name()
+    # get new state
+    new_state = _make_move(game.current_state, move, stats)
 
     # base case: we can find the score instantly.
     # i.e. If it is in seen_states or game is over
+    new_key = state_key(new_state)
 
-    if new_state.__repr__() in seen_states:
-        return seen_states[new_state.__repr__()]
-
-    elif game.is_over(new_state):
-        # get_current_player_name gets the other player's name
-        # since players switch after making a move
-
-        # current player loses, so score = -1
-        if game.is_winner(old_player):
-            seen_states[new_state.__repr__()] = -1
-            return -1
+    if new_key in seen_states:
+        if stats is not None:
+            stats.memo_hits += 1
+        return -seen_states[new_key]
 
-        # current player wins, so score = 1
-        elif game.is_winner(new_player):
-            seen_states[new_state.__repr__()] = 1
-            return 1
-
-        # Neither player has won, thus a tie
-        seen_states[new_state.__repr__()] = 0
-        return 0
+    if stats is not None:
+        stats.memo_misses += 1
+        stats.reached(depth)
+    if _is_over(game, new_state, stats):
+        state_score = _terminal_value(game, new_state, stats)
 
     # else, do recursion.
     # opponent will take their best move.
     # Their best move negatively affects us.
-    move_scores = []
-    for x in new_state.get_possible_moves():
-        # new game for recursion
-        new_game = copy.deepcopy(game)
+    else:
+        state_score = -1
+        # new game for recursion; only its current state differs
+        new_game = copy.copy(game)
         new_game.current_state = new_state
-        # want to stop early if opponent best move already found
-        # new player of state after new_state, i.e. old_player
-        if get_score(new_game, x, seen_states) == 1:
-            seen_states[new_state.__repr__()] = 1
-            return 1
-        # score for each move is -1*state score, since player changes
-        move_scores.append(-1*get_score(new_game, x, seen_states))
-    seen_states[new_state.__repr__()] = max(move_scores)
-    return max(move_scores)
+        if stats is not None:
+            stats.nodes += 1
+        for x in new_state.get_possible_moves():
+            state_score = max(state_score,
+                              get_score(new_game, x, seen_states, stats,
+                                        depth + 1))
+            # want to stop early if opponent best move already found
+            if state_score == 1:
+                if stats is not None:
+                    stats.cutoffs += 1
+                break
+    seen_states[new_key] = state_score
+    # the score for us is -1*state score, since player changes
+    return -state_score
 
 
-def iterative_minimax(game: Union[SubtractSquareGame,
-                                  Stonehenge]) -> Any:
-    """An iterative version of minimax"""
+@uses_table
+@collects_stats
+def inplace_minimax(game: Any,
+                    table: Optional[TranspositionTable] = None,
+                    stats: Optional[SearchStats] = None) -> Any:
+    """Minimax that makes and takes back moves on the current state of
+    game with push and pop, instead of copying games or creating a new
+    state for every position. Apart from the table of scores, memory use
+    grows with the length of the game, not with the positions searched.
+    The current state is left as it was.
+    """
+    state = game.current_state
+    seen_states = table if table is not None else {}
+    best_move = None
+    best_score = -2
+    if stats is not None:
+        stats.nodes += 1
+    for move in state.get_possible_moves():
+        _push(state, move, stats)
+        try:
+            score = -_inplace_score(game, state, seen_states, stats, 1)
+        finally:
+            state.pop()
+        if score > best_score:
+            best_score = score
+            best_move = move
+        if score == 1:
+            if stats is not None:
+                stats.cutoffs += 1
+            break
+    return best_move
 
-    new_game = copy.deepcopy(game)
-    x = Tree(new_game, None)
-    stack = [x]
-    while stack != []:
-        top_of_stack = stack[-1]
-        new_game = top_of_stack.value
-        new_state = new_game.current_state
-        if top_of_stack.value.is_over(new_state):
-            cur_player = new_state.get_current_player_name()
-            if cur_player == 'p1':
-                other_player = 'p2'
+
+def _inplace_score(game: Any, state: Any,
+                   seen_states: Union[Dict[Any, int], TranspositionTable],
+                   stats: Optional[SearchStats], depth: int) -> int:
+    """Return the score of state, depth moves ahead of the current state,
+    for the player to move in it. Moves are pushed onto state while
+    searching, and popped again before returning.
+    """
+    key = state_key(state)
+    if key in seen_states:
+        if stats is not None:
+            stats.memo_hits += 1
+        return seen_states[key]
+    if stats is not None:
+        stats.memo_misses += 1
+        stats.reached(depth)
+    if _is_over(game, state, stats):
+        score = _terminal_value(game, state, stats)
+    else:
+        score = -1
+        if stats is not None:
+            stats.nodes += 1
+        for move in state.get_possible_moves():
+            _push(state, move, stats)
+            try:
+                score = max(score, -_inplace_score(game, state, seen_states,
+                                                   stats, depth + 1))
+            finally:
+                state.pop()
+            if score == 1:
+                if stats is not None:
+                    stats.cutoffs += 1
+                break
+    seen_states[key] = score
+    return score
+
+
+# Default number of processes parallel_minimax uses; None means one per
+# CPU.
+PARALLEL_WORKERS = None
+
+# parallel_minimax searches sequentially when there are fewer moves than
+# this, since starting the work in other processes would cost more than
+# it saves.
+PARALLEL_MIN_MOVES = 6
+
+# pools made by process_pool, by the id of the process that made them and
+# their number of workers
+_POOLS = {}
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """Return a pool of workers processes. Pools are created on first use
+    and then kept, so later moves do not pay to start processes again.
+    A process started by fork gets pools of its own instead of using the
+    ones it inherited."""
+    key = (os.getpid(), workers)
+    if key not in _POOLS:
+        _POOLS[key] = ProcessPoolExecutor(max_workers=workers)
+    return _POOLS[key]
+
+
+def shutdown_pools() -> None:
+    """Shut down the pools this process made with process_pool, and
+    forget every pool, including those inherited from a parent process.
+    Run when the interpreter exits."""
+    pid = os.getpid()
+    pools = list(_POOLS.items())
+    _POOLS.clear()
+    for (owner, _), pool in pools:
+        if owner == pid:
+            pool.shutdown()
+
+
+atexit.register(shutdown_pools)
+
+
+def _worker_score(game: Any, move: Any,
+                  collect: bool) -> Tuple[int, Optional[SearchStats]]:
+    """Return get_score for move with a new memo, and the stats of the
+    search if collect is True. Run in the processes of parallel_minimax.
+    """
+    stats = SearchStats() if collect else None
+    return get_score(game, move, {}, stats), stats
+
+
+@collects_stats
+def parallel_minimax(game: Any, workers: Optional[int] = None,
+                     min_parallel_moves: int = PARALLEL_MIN_MOVES,
+                     stats: Optional[SearchStats] = None) -> Any:
+    """recursive_minimax with the moves of the current state split across
+    a pool of workers processes (PARALLEL_WORKERS by default). Each move
+    is scored with its own memo, and the move chosen is the one
+    recursive_minimax would choose. If stats is given, the searches of
+    the workers are added to it, except those of moves that were not
+    needed.
+    """
+    moves = game.current_state.get_possible_moves()
+    workers = workers or PARALLEL_WORKERS or os.cpu_count() or 1
+    if workers <= 1 or len(moves) < min_parallel_moves:
+        return recursive_minimax(game, stats=stats)
+    pool = process_pool(workers)
+    futures = [pool.submit(_worker_score, game, move, stats is not None)
+               for move in moves]
+    scores = []
+    if stats is not None:
+        stats.nodes += 1
+    for future in futures:
+        score, worker_stats = future.result()
+        if worker_stats is not None:
+            stats.merge(worker_stats)
+        if score == 1:
+            if stats is not None:
+                stats.cutoffs += 1
+            for other in futures:
+                other.cancel()
+            return moves[len(scores)]
+        scores.append(score)
+    return moves[scores.index(max(scores))]
+
+
+# Per-move time budget of iterative_deepening, in seconds.
+DEFAULT_TIME_LIMIT = 2.0
+
+# Scores at the search horizon are scaled by this, so a guess never
+# counts as much as a finished game.
+HORIZON_WEIGHT = 0.5
+
+# Most entries in the table a search makes for itself when none is given.
+# It is an 'lru' table, so it only grows as positions are stored instead
+# of starting with this many slots.
+SEARCH_TABLE_ENTRIES = 1 << 16
+
+
+def horizon_value(state: Any) -> float:
+    """Return a guess at the score of state for the player to move in it,
+    for when a search stops before the end of the game: its evaluate()
+    if it has one, else its rough_outcome()."""
+    try:
+        if hasattr(state, 'evaluate'):
+            return HORIZON_WEIGHT * state.evaluate()
+        return HORIZON_WEIGHT * state.rough_outcome()
+    except (AttributeError, NotImplementedError):
+        return 0
+
+
+class _OutOfTime(Exception):
+    """Raised when a search runs past its deadline."""
+
+
+class _Search:
+    """What one alpha-beta search keeps between the nodes it visits: the
+    transposition table, and the killer moves and history scores used to
+    order moves. If deadline is set, the search raises _OutOfTime once
+    time.perf_counter() passes it. If stats is set, the search is counted
+    in it."""
+    game: Any
+    table: TranspositionTable
+    killers: Dict[int, List[Any]]
+    history: Dict[Any, int]
+    deadline: Optional[float]
+    reached_horizon: bool
+    stats: Optional[SearchStats]
+
+    def __init__(self, game: Any, table: Optional[TranspositionTable],
+                 deadline: Optional[float] = None,
+                 stats: Optional[SearchStats] = None) -> None:
+        """Initializes a search of game, using table if it is given, or
+        else a new table of at most SEARCH_TABLE_ENTRIES entries."""
+        self.game = game
+        if table is None:
+            table = TranspositionTable(SEARCH_TABLE_ENTRIES, policy='lru')
+        self.table = table
+        self.killers = {}
+        self.history = {}
+        self.deadline = deadline
+        self.reached_horizon = False
+        self.stats = stats
+
+    def order_moves(self, state: Any, ply: int, best_move: Any) -> List[Any]:
+        """Return the moves of state, most promising first: the best move
+        from the table, then (for Stonehenge) moves capturing leylines and
+        moves on contested leylines, then killer moves, then moves with a
+        good history."""
+        killers = self.killers.get(ply, [])
+
+        def priority(move: Any) -> tuple:
+            """Sort key for move; smaller sorts first."""
+            if hasattr(state, 'capture_count'):
+                tactics = (-state.capture_count(move),
+                           -state.contested_count(move))
             else:
-                other_player = 'p1'
-            # points
-            if new_game.is_winner(cur_player):
-                top_of_stack.state_value = -1
-            elif new_game.is_winner(other_player):
-                top_of_stack.state_value = 1
-            # Tie
+                tactics = ()
+            return ((move != best_move,) + tactics
+                    + (move not in killers, -self.history.get(move, 0)))
+        return sorted(state.get_possible_moves(), key=priority)
+
+    def record_cutoff(self, move: Any, ply: int, depth: int) -> None:
+        """Remember that move caused a cutoff at ply, depth moves from
+        the end of the search."""
+        if self.stats is not None:
+            self.stats.cutoffs += 1
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        weight = depth * depth if depth < FULL_DEPTH else 1
+        self.history[move] = self.history.get(move, 0) + weight
+
+    def _table_value(self, entry: TableEntry) -> float:
+        """Return the value of entry, which decides the score of its
+        position. If entry depends on guesses at the score of positions
+        where a search stopped, so does this search."""
+        if entry.depth < FULL_DEPTH:
+            self.reached_horizon = True
+        return entry.value
+
+    def negamax(self, state: Any, depth: int, alpha: float, beta: float,
+                ply: int) -> float:
+        """Return the score of state for the player to move in it,
+        searching depth moves ahead. Scores at or below alpha are only
+        upper bounds, and scores at or above beta only lower bounds."""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise _OutOfTime()
+        stats = self.stats
+        key, symmetry = table_key(state)
+        entry = self.table.lookup(key)
+        best_move = None
+        if stats is not None:
+            if entry is not None:
+                stats.memo_hits += 1
             else:
-                top_of_stack.state_value = 0
-            stack.pop(-1)
+                stats.memo_misses += 1
+            stats.reached(ply)
+        if entry is not None:
+            best_move = from_table_move(state, entry.move, symmetry)
+            if entry.depth >= depth:
+                if entry.flag == EXACT:
+                    return self._table_value(entry)
+                elif entry.flag == LOWER_BOUND:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    return self._table_value(entry)
+        if _is_over(self.game, state, stats):
+            value = _terminal_value(self.game, state, stats)
+            self.table.store(key, value)
+            return value
+        if depth == 0:
+            self.reached_horizon = True
+            if stats is None:
+                return horizon_value(state)
+            start = time.perf_counter()
+            value = horizon_value(state)
+            stats.evaluation_time += time.perf_counter() - start
+            return value
+        original_alpha = alpha
+        child_depth = depth - 1 if depth < FULL_DEPTH else FULL_DEPTH
+        best_value = -float('inf')
+        if stats is not None:
+            stats.nodes += 1
+        # whether the score of this position depends on guesses, as
+        # opposed to finished games only
+        outer_horizon = self.reached_horizon
+        self.reached_horizon = False
+        for move in self.order_moves(state, ply, best_move):
+            value = -self.negamax(_make_move(state, move, stats),
+                                  child_depth, -beta, -alpha, ply + 1)
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.record_cutoff(move, ply, depth)
+                break
+        if best_value <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_value >= beta:
+            flag = LOWER_BOUND
         else:
-            # We have not looked at this one yet
-            if top_of_stack.children == []:
-                not_looked_at_this_yet(stack)
-            # We have looked at this before, and we have
-            # evaluated value of all its future possible states
+            flag = EXACT
+        # a score found without guesses holds however deep the search
+        proven = not self.reached_horizon
+        self.reached_horizon = outer_horizon or not proven
+        self.table.store(key, best_value, FULL_DEPTH if proven else depth,
+                         flag, to_table_move(state, best_move, symmetry))
+        return best_value
+
+    def best_move(self, state: Any, depth: int) -> Any:
+        """Return the best move in state, searching depth moves ahead."""
+        alpha = -1
+        best_value = -float('inf')
+        best_move = None
+        child_depth = depth - 1 if depth < FULL_DEPTH else FULL_DEPTH
+        key, symmetry = table_key(state)
+        entry = self.table.lookup(key)
+        table_move = from_table_move(state, entry and entry.move, symmetry)
+        if self.stats is not None:
+            self.stats.nodes += 1
+        for move in self.order_moves(state, 0, table_move):
+            value = -self.negamax(_make_move(state, move, self.stats),
+                                  child_depth, -1, -alpha, 1)
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+            if alpha >= 1:
+                if self.stats is not None:
+                    self.stats.cutoffs += 1
+                break
+        return best_move
+
+
+@uses_table
+@collects_stats
+def alphabeta_minimax(game: Any,
+                      table: Optional[TranspositionTable] = None,
+                      stats: Optional[SearchStats] = None) -> Any:
+    """Minimax with alpha-beta pruning, in negamax form. Moves are tried
+    in a promising order, so most of the tree minimax visits is cut off,
+    but the move returned has the same score minimax would give it.
+    """
+    return _Search(game, table, stats=stats).best_move(game.current_state,
+                                                       FULL_DEPTH)
+
+
+@uses_table
+@collects_stats
+def iterative_deepening(game: Any,
+                        table: Optional[TranspositionTable] = None,
+                        time_limit: float = DEFAULT_TIME_LIMIT,
+                        stats: Optional[SearchStats] = None) -> Any:
+    """Alpha-beta search to depth 1, then 2, 3, and so on, until
+    time_limit seconds have passed. Positions at the end of a search are
+    scored by horizon_value. Returns the best move of the deepest search
+    that finished, so a move is always ready in about time_limit seconds,
+    however big the game.
+
+    Guesses left in a table kept between moves do not stop a search
+    early, but scores it has proven from finished games do:
+    >>> table = TranspositionTable()
+    >>> game = Stonehenge(True, 2)
+    >>> _ = _Search(game, table).best_move(game.current_state, 2)
+    >>> depths = []
+    >>> for _ in range(2):
+    ...     stats = SearchStats()
+    ...     _ = iterative_deepening(game, table, 10, stats)
+    ...     depths.append(stats.max_depth)
+    >>> depths
+    [5, 1]
+    """
+    state = game.current_state
+    search = _Search(game, table, time.perf_counter() + time_limit, stats)
+    move = state.get_possible_moves()[0]
+    depth = 1
+    while True:
+        search.reached_horizon = False
+        try:
+            move = search.best_move(state, depth)
+        except _OutOfTime:
+            break
+        # every line of play reached the end of the game
+        if not search.reached_horizon:
+            break
+        depth += 1
+    return move
+
+
+@uses_table
+@collects_stats
+def iterative_minimax(game: Union[SubtractSquareGame,
+                                  Stonehenge],
+                      table: Optional[TranspositionTable] = None,
+                      stats: Optional[SearchStats] = None) -> Any:
+    """An iterative version of minimax.
+    Only the states on the path being searched are kept. Each Tree holds
+    a state key and a move, and loses its children once its score is
+    known, so memory grows with depth times the number of moves per state,
+    not with the size of the game tree. Scores are shared through table,
+    or a new dict, so a position reached twice is only searched once."""
+    seen_states = table if table is not None else {}
+    states = [game.current_state]
+    x = Tree(state_key(game.current_state), None)
+    stack = [x]
+    while stack != []:
+        top_of_stack = stack[-1]
+        new_state = states[-1]
+        # We have not looked at this one yet
+        if (top_of_stack.state_value is None
+                and top_of_stack.children == []):
+            if top_of_stack is not x and top_of_stack.value in seen_states:
+                top_of_stack.state_value = seen_states[top_of_stack.value]
+                if stats is not None:
+                    stats.memo_hits += 1
             else:
-                values_list = [child.state_value for
-                               child in top_of_stack.children]
-                top_of_stack.state_value = -1*max(values_list)
-                stack.pop(-1)
-    set_of_values = [child.state_value for
-                     child in x.children]
-    moves = [child.move_made for child
-             in x.children]
+                if stats is not None:
+                    stats.memo_misses += top_of_stack is not x
+                    stats.reached(len(stack) - 1)
+                if _is_over(game, new_state, stats):
+                    top_of_stack.state_value = _terminal_value(
+                        game, new_state, stats)
+                else:
+                    if stats is not None:
+                        stats.nodes += 1
+                    top_of_stack.children = [
+                        Tree(None, move)
+                        for move in new_state.get_possible_moves()]
+        if top_of_stack.state_value is None:
+            child = next_child_to_score(top_of_stack)
+            if child is not None:
+                child_state = _make_move(new_state, child.move_made, stats)
+                child.value = state_key(child_state)
+                stack.append(child)
+                states.append(child_state)
+                continue
+            # We have evaluated value of all its future possible states
+            # that matter, so its children are no longer needed
+            top_of_stack.state_value = max(
+                -child.state_value for child in top_of_stack.children
+                if child.state_value is not None)
+            if stats is not None and any(child.state_value is None for child
+                                         in top_of_stack.children):
+                stats.cutoffs += 1
+            seen_states[top_of_stack.value] = top_of_stack.state_value
+            if top_of_stack is not x:
+                top_of_stack.children = []
+        stack.pop()
+        states.pop()
+    scored = [child for child in x.children if child.state_value is not None]
+    set_of_values = [-child.state_value for child in scored]
     index_of_it = set_of_values.index(max(set_of_values))
-    return moves[index_of_it]
-
-
-def not_looked_at_this_yet(stack: List[Tree]) -> None:
-    """We find a Tree that we have not looked at yet in
-    the stack. We identify this from the Tree having
-    no children."""
-    top_of_stack = stack[-1]
-    new_game = top_of_stack.value
-    for move in new_game.current_state.get_possible_moves():
-        new_state = new_game.current_state.make_move(move)
-        newest_game = copy.deepcopy(new_game)
-        newest_game.current_state = new_state
-        new_tree = Tree(newest_game, move)
-        top_of_stack.children.append(new_tree)
-        stack.append(new_tree)
+    return scored[index_of_it].move_made
+
+
+def next_child_to_score(tree: Tree) -> Optional[Tree]:
+    """Return the first child of tree that has no score yet, or None if
+    every child has a score, or a child already loses for the player to
+    move in it (so tree's score cannot get any better)."""
+    for child in tree.children:
+        if child.state_value == -1:
+            return None
+        if child.state_value is None:
+            return child
+    return None
@@ -2,19 +2,28 @@
 Subtract square. This is a subclass of GenericGame, and
 CurrentState respectively.
 """
-from typing import List, Any
+from typing import List, Any, Tuple, Optional
+from bisect import bisect_right
 from  generic_game import GenericGame, CurrentState
 
+# The squares 1, 4, 9, ... found so far, and the same as strings, so
+# get_possible_moves does not rebuild them for every state. More are
+# added by replacing both lists at once, never by changing them, so
+# states used from several threads always see lists that match.
+_SQUARES = ([], [])
+
 class SubtractSquare(GenericGame):
     """Represents the game subtract square."""
     current_state: 'SubtractSquareState'
     current_num: str
 
-    def __init__(self, player: bool) -> None:
+    def __init__(self, player: bool, number: Optional[int] = None) -> None:
 
         """Initializes the game subtract square, by setting the
-         starting player and number."""
-        self.current_num = input("please select a number to begin with: ")
+         starting player and number. The number is asked for unless it is
+         given."""
+        self.current_num = str(number) if number is not None else input(
+            "please select a number to begin with: ")
         while not self.current_num.isdigit():
             self.current_num = input("please select a number to begin with: ")
         if player:
@@ -49,18 +58,25 @@ class SubtractSquareState(CurrentState):
         True"""
         self.number = number
         self.player = player
+        # moves made with push
+        self._undo = []
 
     def get_possible_moves(self) -> List[str]:
         """returns a list of all possible moves.
         >>> s = SubtractSquareState(number=20)
         >>> s.get_possible_moves()
         ['1', '4', '9', '16']"""
-        natural = 1
-        possible_moves = []
-        while natural**2 <= self.number:
-            possible_moves.append(str(natural**2))
-            natural += 1
-        return possible_moves
+        global _SQUARES
+        squares, square_strs = _SQUARES
+        natural = len(squares) + 1
+        if natural**2 <= self.number:
+            squares, square_strs = list(squares), list(square_strs)
+            while natural**2 <= self.number:
+                squares.append(natural**2)
+                square_strs.append(str(natural**2))
+                natural += 1
+            _SQUARES = (squares, square_strs)
+        return square_strs[:bisect_right(squares, self.number)]
 
     def make_move(self, move: str) -> 'SubtractSquareState':
         """makes a move. Returns a new SubtractSquareState.
@@ -72,6 +88,25 @@ class SubtractSquareState(CurrentState):
             return SubtractSquareState('p2', int(self.number) - int(move))
         return SubtractSquareState('p1', int(self.number) - int(move))
 
+    def push(self, move: str) -> None:
+        """makes a move on this state itself, instead of returning a new
+        one. It can be taken back with pop.
+        >>> s = SubtractSquareState()
+        >>> s.push('25')
+        >>> print(s)
+        p2 turn to move. Current number is 32
+        >>> s.pop()
+        >>> print(s)
+        p1 turn to move. Current number is 57"""
+        self._undo.append(int(move))
+        self.number = int(self.number) - int(move)
+        self.player = 'p2' if self.player == 'p1' else 'p1'
+
+    def pop(self) -> None:
+        """takes back the last move made with push."""
+        self.number += self._undo.pop()
+        self.player = 'p2' if self.player == 'p1' else 'p1'
+
     def __str__(self) -> str:
         """A string represention of SubtractSquareState
         >>> s = SubtractSquareState()
@@ -92,8 +127,36 @@ class SubtractSquareState(CurrentState):
         >>> s == y
         False
         """
-        return (type(self) == type(other) and self.number == other.number
-                and self.player == other.player)
+        return type(self) == type(other) and self.key() == other.key()
+
+    def key(self) -> Tuple[str, int]:
+        """Returns a compact key identifying this state.
+        >>> SubtractSquareState('p2', 30).key()
+        ('p2', 30)
+        """
+        return (self.player, int(self.number))
+
+    def __hash__(self) -> int:
+        """Returns a hash of this state, consistent with __eq__."""
+        return hash(self.key())
+
+    def to_bytes(self) -> bytes:
+        """Returns this state packed into 8 bytes: the number, shifted up
+        one bit to make room for a bit that is set when it is p2's turn.
+        >>> s = SubtractSquareState('p2', 30)
+        >>> s.to_bytes()
+        b'=\\x00\\x00\\x00\\x00\\x00\\x00\\x00'
+        >>> SubtractSquareState.from_bytes(s.to_bytes()) == s
+        True
+        """
+        return (int(self.number) << 1 | (self.player == 'p2')).to_bytes(
+            8, 'little')
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'SubtractSquareState':
+        """Returns the state packed into data by to_bytes."""
+        packed = int.from_bytes(data, 'little')
+        return SubtractSquareState('p2' if packed & 1 else 'p1', packed >> 1)
 
 if __name__ == "__main__":
     import python_ta
@@ -0,0 +1,143 @@
+"""A solver for Subtract Square that works out every starting number up to
+a limit in one pass from 0 upwards, and a strategy that plays perfectly
+by looking numbers up in its table.
+
+A number is lost for the player to move if every square they can
+subtract leaves a won number, and won otherwise. Going upwards, each
+lost number n makes n + 1, n + 4, n + 9, ... won; with NumPy that step
+is done for all squares at once. The table can be saved to and loaded
+from a file. NumPy is used if it is installed; otherwise a slower pure
+Python loop gives the same table.
+"""
+from array import array
+from typing import Any
+import os
+import threading
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# File to keep the table in between runs, or None to only keep it in
+# memory.
+CACHE_PATH = None
+
+_TABLES = []
+# held while a new table is solved, so threads needing one at the same
+# time solve it once
+_SOLVING = threading.Lock()
+
+
+class SubtractSquareTable:
+    """The solution of Subtract Square for every number up to limit.
+
+    moves[n] is 0 if n is lost for the player to move, and otherwise a
+    square that can be subtracted from n to leave a lost number. It is a
+    NumPy int32 array, or an array of C ints without NumPy; either way it
+    is stored on disk as raw native 32 bit integers.
+    >>> t = SubtractSquareTable(20)
+    >>> [n for n in range(21) if not t.is_win(n)]
+    [0, 2, 5, 7, 10, 12, 15, 17, 20]
+    >>> t.best_move(11)
+    9
+    """
+    limit: int
+    moves: Any
+
+    def __init__(self, limit: int, moves: Any = None) -> None:
+        """Initializes the table for numbers up to limit, solving it
+        unless moves is given."""
+        self.limit = limit
+        self.moves = moves if moves is not None else _solve(limit)
+
+    def is_win(self, number: int) -> bool:
+        """Return whether number is won for the player to move."""
+        return self.moves[number] != 0
+
+    def best_move(self, number: int) -> int:
+        """Return a square to subtract from number that leaves a lost
+        number, or 0 if there is none."""
+        return int(self.moves[number])
+
+    def save(self, path: str) -> None:
+        """Write this table to the file at path."""
+        with open(path, 'wb') as file:
+            self.moves.tofile(file)
+
+    @staticmethod
+    def load(path: str) -> 'SubtractSquareTable':
+        """Return the table saved in the file at path."""
+        if numpy is not None:
+            moves = numpy.fromfile(path, dtype=numpy.int32)
+        else:
+            moves = array('i')
+            with open(path, 'rb') as file:
+                moves.frombytes(file.read())
+        return SubtractSquareTable(len(moves) - 1, moves)
+
+
+def _solve(limit: int) -> Any:
+    """Return the moves table of SubtractSquareTable for limit."""
+    if numpy is not None:
+        moves = numpy.zeros(limit + 1, dtype=numpy.int32)
+        root = int(limit ** 0.5) + 1
+        squares = numpy.arange(1, root + 1, dtype=numpy.int64) ** 2
+        for number in range(limit + 1):
+            if moves[number] == 0:
+                targets = number + squares[:numpy.searchsorted(
+                    squares, limit - number, side='right')]
+                targets = targets[moves[targets] == 0]
+                moves[targets] = targets - number
+        return moves
+    moves = array('i', bytes(4 * (limit + 1)))
+    squares = []
+    natural = 1
+    while natural * natural <= limit:
+        squares.append(natural * natural)
+        natural += 1
+    for number in range(limit + 1):
+        if moves[number] == 0:
+            for square in squares:
+                target = number + square
+                if target > limit:
+                    break
+                if moves[target] == 0:
+                    moves[target] = square
+    return moves
+
+
+def get_table(number: int) -> SubtractSquareTable:
+    """Return a table covering number. Tables are kept in memory, and in
+    CACHE_PATH if it is set; a new one is solved only when number is
+    beyond the largest kept so far, and then covers at least twice as
+    much."""
+    tables = list(_TABLES)
+    if tables and tables[0].limit >= number:
+        return tables[0]
+    with _SOLVING:
+        if _TABLES and _TABLES[0].limit >= number:
+            return _TABLES[0]
+        if CACHE_PATH is not None and os.path.exists(CACHE_PATH):
+            table = SubtractSquareTable.load(CACHE_PATH)
+        else:
+            table = None
+        if table is None or table.limit < number:
+            limit = max(number, 2 * _TABLES[0].limit if _TABLES else 1024)
+            table = SubtractSquareTable(limit)
+            if CACHE_PATH is not None:
+                table.save(CACHE_PATH)
+        _TABLES[:] = [table]
+    return table
+
+
+def subtract_square_strategy(game: Any) -> Any:
+    """Return the best move in the current state of the Subtract Square
+    game game, looked up in a solved table.
+    """
+    number = int(game.current_state.number)
+    return str(get_table(number).best_move(number) or 1)
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a1_pyta.txt")
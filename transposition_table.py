@@ -0,0 +1,162 @@
+"""A bounded transposition table, used by the strategies in strategy.py to
+remember the values of positions they have already searched. One table can
+be kept for a whole game, so a search reuses the work of earlier moves.
+"""
+from collections import OrderedDict
+from typing import Any, Optional
+
+# What an entry's value means.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# The depth of values from searches that went all the way to the end of
+# the game. These are never replaced by shallower results.
+FULL_DEPTH = 1 << 30
+
+# A rough size of one entry in bytes, used to turn a byte budget into a
+# number of entries.
+ENTRY_BYTES = 200
+
+
+class TableEntry:
+    """A position stored in a TranspositionTable.
+
+    value is the score of the position for the player to move in it, found
+    by a search depth moves deep. flag says whether value is the exact
+    score, or only a lower or upper bound on it. move is the best move
+    found, or None.
+    """
+    __slots__ = ('key', 'value', 'depth', 'flag', 'move')
+    key: Any
+    value: float
+    depth: int
+    flag: int
+    move: Any
+
+    def __init__(self, key: Any, value: float, depth: int, flag: int,
+                 move: Any) -> None:
+        """Initializes a TableEntry."""
+        self.key = key
+        self.value = value
+        self.depth = depth
+        self.flag = flag
+        self.move = move
+
+
+class TranspositionTable:
+    """A table of searched positions, keyed by state key, holding at most
+    capacity entries.
+
+    With the 'depth' policy the table is a fixed array of slots indexed by
+    the hash of the key, and a new entry only replaces the one in its slot
+    if it comes from a search at least as deep. With the 'lru' policy the
+    least recently used entry is dropped when the table is full.
+
+    The table can also be used like the dict of exact scores get_score
+    takes: only exact, full depth entries are visible that way.
+    >>> t = TranspositionTable(max_entries=2, policy='lru')
+    >>> t[('p1', 4)] = 1
+    >>> t[('p2', 3)] = -1
+    >>> t.store(('p1', 2), 0.5, depth=2)
+    >>> ('p1', 4) in t, len(t)
+    (False, 2)
+    >>> t.lookup(('p1', 2)).depth
+    2
+    >>> ('p1', 2) in t
+    False
+    """
+    capacity: int
+    policy: str
+    hits: int
+    misses: int
+
+    def __init__(self, max_entries: int = 1 << 20,
+                 max_bytes: Optional[int] = None,
+                 policy: str = 'depth') -> None:
+        """Initializes an empty table. If max_bytes is given, it sets the
+        capacity instead of max_entries."""
+        if policy not in ('depth', 'lru'):
+            raise ValueError("policy must be 'depth' or 'lru'")
+        if max_bytes is not None:
+            max_entries = max_bytes // ENTRY_BYTES
+        self.capacity = max(1, max_entries)
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self) -> None:
+        """Removes every entry from this table."""
+        if self.policy == 'depth':
+            self._slots = [None] * self.capacity
+            self._size = 0
+        else:
+            self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns the number of entries in this table."""
+        if self.policy == 'depth':
+            return self._size
+        return len(self._entries)
+
+    def lookup(self, key: Any) -> Optional[TableEntry]:
+        """Returns the entry stored for key, or None if there is none."""
+        if self.policy == 'depth':
+            entry = self._slots[hash(key) % self.capacity]
+            if entry is not None and entry.key != key:
+                entry = None
+        else:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, key: Any, value: float, depth: int = FULL_DEPTH,
+              flag: int = EXACT, move: Any = None) -> None:
+        """Stores value as the score of the position with key key, unless
+        an entry from a deeper search is already in its place."""
+        entry = TableEntry(key, value, depth, flag, move)
+        if self.policy == 'depth':
+            index = hash(key) % self.capacity
+            old = self._slots[index]
+            if old is None:
+                self._size += 1
+            elif old.depth > depth:
+                return
+            self._slots[index] = entry
+        else:
+            old = self._entries.get(key)
+            if old is not None:
+                if old.depth > depth:
+                    return
+                del self._entries[key]
+            elif len(self._entries) >= self.capacity:
+                self._entries.popitem(last=False)
+            self._entries[key] = entry
+
+    def __contains__(self, key: Any) -> bool:
+        """Returns whether key has an exact, full depth entry."""
+        entry = self.lookup(key)
+        return (entry is not None and entry.flag == EXACT
+                and entry.depth >= FULL_DEPTH)
+
+    def __getitem__(self, key: Any) -> float:
+        """Returns the value stored for key."""
+        entry = self.lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry.value
+
+    def __setitem__(self, key: Any, value: float) -> None:
+        """Stores value as the exact, full depth score of key."""
+        self.store(key, value)
+
+
+if __name__ == '__main__':
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")